@@ -0,0 +1,42 @@
+"""Compare two benchmark reports and exit with 1 on regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    regressions = 0
+    for name, before in sorted(baseline["endpoints"].items()):
+        after = current["endpoints"].get(name)
+        if after is None:
+            continue
+        for metric in METRICS:
+            change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            marker = ""
+            if change > args.threshold:
+                marker = "  REGRESSION"
+                regressions += 1
+            print(f"{name:14} {metric:7} {before[metric]:9.2f} -> {after[metric]:9.2f} ({change:+.1%}){marker}")
+        if before.get("queries_per_request") is not None and after.get("queries_per_request") is not None:
+            print(f"{name:14} queries {before['queries_per_request']:9.2f} -> {after['queries_per_request']:9.2f}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
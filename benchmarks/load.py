@@ -0,0 +1,208 @@
+"""Load test for main:app.
+
+Runs the app in-process (or against --url), seeds users and todos and drives a
+weighted mix of requests. Prints a JSON report with p50/p95/p99 latency,
+throughput and SQL statements per request for every endpoint.
+
+    python -m benchmarks.load --dsn postgresql+asyncpg://... --output results.json
+    python -m benchmarks.load --docker
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.database import BENCH_PASSWORD, configure_environment, seed, start_container, stop_container, \
+    wait_for
+
+MIX = {
+    "login": 5,
+    "todos_my": 40,
+    "todos_create": 15,
+    "todos_update": 20,
+    "users_me": 20,
+}
+
+current_queries: contextvars.ContextVar[list | None] = contextvars.ContextVar("current_queries", default=None)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, username: str):
+        self.client = client
+        self.username = username
+        self.headers: dict[str, str] = {}
+        self.todo_ids: list[int] = []
+
+    async def login(self):
+        response = await self.client.post("/auth/login", json={"username": self.username, "password": BENCH_PASSWORD})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def todos_my(self):
+        response = await self.client.get("/todos/my", headers=self.headers)
+        if response.status_code == 200 and not self.todo_ids:
+            self.todo_ids = [todo["id"] for todo in response.json()]
+        return response
+
+    async def todos_create(self):
+        response = await self.client.post("/todos/create", headers=self.headers,
+                                          json={"description": f"created by {self.username}"})
+        if response.status_code == 200:
+            self.todo_ids.append(response.json()["id"])
+        return response
+
+    async def todos_update(self):
+        if not self.todo_ids:
+            return await self.todos_create()
+        return await self.client.put(f"/todos/{random.choice(self.todo_ids)}/update", headers=self.headers,
+                                     json={"state": random.choice(["done", "active", "passive", "important"])})
+
+    async def users_me(self):
+        return await self.client.get("/users/me", headers=self.headers)
+
+
+async def run_user(user: VirtualUser, deadline: float, samples, queries, errors):
+    names = list(MIX)
+    weights = [MIX[name] for name in names]
+    while time.monotonic() < deadline:
+        name = random.choices(names, weights)[0]
+        counter = [0]
+        token = current_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await getattr(user, name)()
+            if response.status_code >= 400:
+                errors[name] += 1
+        except httpx.HTTPError:
+            errors[name] += 1
+        finally:
+            samples[name].append((time.perf_counter() - started) * 1000)
+            queries[name].append(counter[0])
+            current_queries.reset(token)
+
+
+def count_statements(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(*args):
+        counter = current_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args) -> dict:
+    container = None
+    dsn = args.dsn or os.getenv("BENCH_DB_CONFIG")
+    if args.docker:
+        container, dsn = start_container()
+    if dsn is None and args.url is None:
+        raise SystemExit("Pass --dsn, --docker or --url (or set BENCH_DB_CONFIG)")
+
+    try:
+        usernames = []
+        if dsn is not None:
+            configure_environment(dsn)
+            await wait_for(dsn)
+            usernames = await seed(dsn, args.users, args.todos)
+
+        if args.url is not None:
+            client = httpx.AsyncClient(base_url=args.url, timeout=30)
+            lifespan = None
+        else:
+            from main import app
+            from services.database import sessionmanager
+
+            lifespan = app.router.lifespan_context(app)
+            await lifespan.__aenter__()
+            count_statements(sessionmanager._engine)
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+        samples, queries, errors = defaultdict(list), defaultdict(list), defaultdict(int)
+        try:
+            users = [VirtualUser(client, usernames[i % len(usernames)]) for i in range(args.concurrency)]
+            await asyncio.gather(*(user.login() for user in users))
+            started = time.monotonic()
+            await asyncio.gather(*(run_user(user, started + args.duration, samples, queries, errors)
+                                   for user in users))
+            elapsed = time.monotonic() - started
+        finally:
+            await client.aclose()
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+    finally:
+        if container is not None:
+            stop_container(container)
+
+    endpoints = {}
+    for name, values in samples.items():
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "throughput_rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "mean_ms": statistics.fmean(values),
+            "queries_per_request": statistics.fmean(queries[name]) if args.url is None else None,
+        }
+    total = sum(len(values) for values in samples.values())
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "duration_s": elapsed,
+        "throughput_rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="postgresql+asyncpg DSN of a throwaway database")
+    parser.add_argument("--docker", action="store_true", help="start a throwaway postgres container")
+    parser.add_argument("--url", help="benchmark an already running server instead of main:app in-process")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--todos", type=int, default=200, help="todos seeded per user")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    dumped = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(dumped)
+    else:
+        sys.stdout.write(dumped + "\n")
+
+
+if __name__ == "__main__":
+    main()
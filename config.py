@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from uuid import uuid4
 
 from dotenv import load_dotenv
 from fastapi_jwt import JwtAccessBearerCookie, JwtRefreshBearerCookie
@@ -7,7 +8,24 @@ from fastapi_jwt import JwtAccessBearerCookie, JwtRefreshBearerCookie
 load_dotenv()
 
 
+def env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
 class Config:
+    HOST = os.getenv("HOST", "0.0.0.0")
+    PORT = int(os.getenv("PORT") or 8080)
+    # proxies whose X-Forwarded-For is trusted for the client address, per-IP rate limits key on that address.
+    # On the platform the router is the only way in and appends the real client, so every peer is trusted there.
+    FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS") or ("*" if os.getenv("DYNO") else "127.0.0.1")
+    KEEPALIVE_SECONDS = int(os.getenv("KEEPALIVE_SECONDS", 5))
+    # readiness fails for this long after SIGTERM before the server stops accepting connections
+    DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", 0))
+    GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", 25))
+    HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 2))
+    # request_seconds and the slow request log cover most needs, per-request lines cost throughput
+    ACCESS_LOG = env_flag("ACCESS_LOG", False)
+
     DB_CONFIG = os.getenv(
         "DB_CONFIG",
         "postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}".format(
@@ -18,6 +36,131 @@ class Config:
         ),
     )
 
+    DB_REPLICAS = [dsn.strip() for dsn in os.getenv("DB_REPLICAS", "").split(",") if dsn.strip()]
+    DB_REPLICA_COOLDOWN = float(os.getenv("DB_REPLICA_COOLDOWN", 30))
+    DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+    DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", DB_POOL_SIZE))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+    DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 100))
+    # transaction-pooling PgBouncer can't keep named prepared statements between transactions
+    DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+
+    TODOS_PAGE_SIZE = int(os.getenv("TODOS_PAGE_SIZE", 100))
+    TODOS_PAGE_SIZE_MAX = int(os.getenv("TODOS_PAGE_SIZE_MAX", 1000))
+    TODOS_STREAM_BATCH_SIZE = int(os.getenv("TODOS_STREAM_BATCH_SIZE", 500))
+    TODOS_BATCH_MAX = int(os.getenv("TODOS_BATCH_MAX", 1000))
+    TODOS_IMPORT_CHUNK_SIZE = int(os.getenv("TODOS_IMPORT_CHUNK_SIZE", 5000))
+    # a chunk is also flushed once its descriptions add up to this many bytes
+    TODOS_IMPORT_CHUNK_BYTES = int(os.getenv("TODOS_IMPORT_CHUNK_BYTES", 8 << 20))
+    TODOS_IMPORT_DESCRIPTION_MAX_LENGTH = int(os.getenv("TODOS_IMPORT_DESCRIPTION_MAX_LENGTH", 10000))
+    TODOS_IMPORT_MAX_LINE_BYTES = int(os.getenv("TODOS_IMPORT_MAX_LINE_BYTES", 1 << 20))
+    TODOS_IMPORT_PROGRESS_TTL = float(os.getenv("TODOS_IMPORT_PROGRESS_TTL", 86400))
+    # stats are cached per todos_version, so stale entries are never served and only need evicting
+    TODOS_STATS_CACHE_TTL = float(os.getenv("TODOS_STATS_CACHE_TTL", 3600))
+    TODO_CHANGES_RETENTION_DAYS = float(os.getenv("TODO_CHANGES_RETENTION_DAYS", 30))
+    TODO_CHANGES_COMPACT_INTERVAL = float(os.getenv("TODO_CHANGES_COMPACT_INTERVAL", 3600))
+
+    PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+    # per web worker, 0 splits the cores between them (resolved below, after WEB_CONCURRENCY)
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 0))
+    PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", 0)) or None
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 1))
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+    # postgres (shared between workers) or memory (single worker only)
+    TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "postgres")
+    TOKEN_SWEEP_INTERVAL = float(os.getenv("TOKEN_SWEEP_INTERVAL", 3600))
+    ACCESS_TOKEN_CACHE_SIZE = int(os.getenv("ACCESS_TOKEN_CACHE_SIZE", 10000))
+
+    RATE_LIMIT_ENABLED = env_flag("RATE_LIMIT_ENABLED", True)
+    # memory (per process) or redis (shared between workers)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL") or os.getenv("CACHE_URL")
+    RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+    RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "60/minute")
+    RATE_LIMIT_SIGNUP = os.getenv("RATE_LIMIT_SIGNUP", "5/minute")
+    RATE_LIMIT_USERS = os.getenv("RATE_LIMIT_USERS", "300/minute")
+    RATE_LIMIT_TODOS = os.getenv("RATE_LIMIT_TODOS", "1200/minute")
+    RATE_LIMIT_SHARE = os.getenv("RATE_LIMIT_SHARE", "120/minute")
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL") or "info"
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 1))
+
+    # memory (per process), redis (shared between workers) or none
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_URL = os.getenv("CACHE_URL")
+    CACHE_TTL = float(os.getenv("CACHE_TTL", 60))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+
+    JOBS_ENABLED = env_flag("JOBS_ENABLED", True)
+    # workers per web process, each runs one job at a time
+    JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", 2))
+    JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 1))
+    JOBS_TIMEOUT = float(os.getenv("JOBS_TIMEOUT", 120))
+    # running jobs locked for longer than this are assumed lost with their worker
+    JOBS_STALE_SECONDS = float(os.getenv("JOBS_STALE_SECONDS", 600))
+    JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", 5))
+    JOBS_RETRY_MAX_SECONDS = float(os.getenv("JOBS_RETRY_MAX_SECONDS", 3600))
+    JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 8))
+    USER_PURGE_CHUNK_SIZE = int(os.getenv("USER_PURGE_CHUNK_SIZE", 1000))
+
+    # rotating the secret invalidates every share link handed out so far; without one, sharing is off
+    SHARE_SECRET = os.getenv("SHARE_SECRET") or os.getenv("JWT_SECRET")
+    SHARE_MAX_AGE = int(os.getenv("SHARE_MAX_AGE", 60))
+    SHARE_SHARED_MAX_AGE = int(os.getenv("SHARE_SHARED_MAX_AGE", 300))
+
+    # memory (single worker only) or postgres (LISTEN/NOTIFY, shared between workers)
+    BROKER_BACKEND = os.getenv("BROKER_BACKEND", "memory")
+    # LISTEN needs a session-level connection, point this past pgbouncer in transaction mode
+    BROKER_URL = os.getenv("BROKER_URL") or DB_CONFIG
+    BROKER_QUEUE_SIZE = int(os.getenv("BROKER_QUEUE_SIZE", 100))
+    BROKER_MAX_SUBSCRIBERS = int(os.getenv("BROKER_MAX_SUBSCRIBERS", 50000))
+    # how often the postgres broker checks its LISTEN connection
+    BROKER_HEALTH_INTERVAL = float(os.getenv("BROKER_HEALTH_INTERVAL", 10))
+    SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+
+    # these keep their state inside one process, so workers would serve stale cache entries, miss each
+    # other's events, multiply rate limits, lose track of imports and send reads after another worker's write
+    # to a lagging replica; read-your-writes can only be turned off, by DB_READ_YOUR_WRITES_SECONDS=0 or no replicas
+    PROCESS_LOCAL_BACKENDS = [name for name, local in (
+        ("CACHE_BACKEND", CACHE_BACKEND == "memory"),
+        ("BROKER_BACKEND", BROKER_BACKEND == "memory"),
+        ("RATE_LIMIT_BACKEND", RATE_LIMIT_ENABLED and RATE_LIMIT_BACKEND == "memory"),
+        ("TOKEN_STORE_BACKEND", TOKEN_STORE_BACKEND == "memory"),
+        ("DB_READ_YOUR_WRITES_SECONDS", bool(DB_REPLICAS) and DB_READ_YOUR_WRITES_SECONDS > 0),
+    ) if local]
+    # one worker per core once every backend above is shared, a single worker otherwise;
+    # every worker owns its own pools, keep WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under max_connections
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 0)) or \
+        (1 if PROCESS_LOCAL_BACKENDS else os.cpu_count() or 1)
+    PASSWORD_HASH_WORKERS = PASSWORD_HASH_WORKERS or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+    @classmethod
+    def engine_options(cls) -> dict:
+        connect_args = {
+            "statement_cache_size": cls.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": cls.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        }
+        if cls.DB_PGBOUNCER:
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        return {
+            "pool_size": cls.DB_POOL_SIZE,
+            "max_overflow": cls.DB_MAX_OVERFLOW,
+            "pool_timeout": cls.DB_POOL_TIMEOUT,
+            "pool_recycle": cls.DB_POOL_RECYCLE,
+            "pool_pre_ping": cls.DB_POOL_PRE_PING,
+            "connect_args": connect_args,
+        }
+
 
 class JWTConfig:
     refresh_expires_delta = timedelta(days=30)
@@ -1,36 +1,114 @@
-import os
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import config
+from models.change import TodoChange
+from services.broker import broker
+from services.cache import cache
 from services.database import sessionmanager
+from services.health import health
+from services.instrumentation import TimingMiddleware
+from services.jobs import job_runner
+from services.passwords import password_hasher
+from services.ratelimit import RateLimitMiddleware, limiter
+from services.tasks import PeriodicTask
+from services.token_store import token_store
 from utils import JWTPayloadError
+from utils.log import configure_logging
 from views.user import router as user_router
 from views.todo import router as todo_router
 from views.auth import router as auth_router
+from views.metrics import router as metrics_router
+from views.health import router as health_router
+from views.share import router as share_router
 
+configure_logging(config.LOG_LEVEL)
 
-sessionmanager.init(config.DB_CONFIG)
+
+async def compact_todo_changes():
+    async with sessionmanager.session() as session:
+        await TodoChange.compact(
+            session, datetime.now(timezone.utc) - timedelta(days=config.TODO_CHANGES_RETENTION_DAYS)
+        )
 
 
 @asynccontextmanager
 async def lifespan(server: FastAPI):
+    # engines are created per worker, pooled connections can't be shared across forked processes
+    sessionmanager.init(
+        config.DB_CONFIG,
+        replicas=config.DB_REPLICAS,
+        replica_cooldown=config.DB_REPLICA_COOLDOWN,
+        sticky_seconds=config.DB_READ_YOUR_WRITES_SECONDS,
+        **config.engine_options(),
+    )
+    password_hasher.init(
+        executor=config.PASSWORD_HASH_EXECUTOR,
+        workers=config.PASSWORD_HASH_WORKERS,
+        max_concurrency=config.PASSWORD_HASH_MAX_CONCURRENCY,
+        max_queue=config.PASSWORD_HASH_MAX_QUEUE,
+        rounds=config.BCRYPT_ROUNDS,
+        retry_after=config.PASSWORD_HASH_RETRY_AFTER,
+    )
+    cache.init(
+        backend=config.CACHE_BACKEND,
+        url=config.CACHE_URL,
+        ttl=config.CACHE_TTL,
+        max_entries=config.CACHE_MAX_ENTRIES,
+    )
+    token_store.init(config.TOKEN_STORE_BACKEND)
+    limiter.init(enabled=config.RATE_LIMIT_ENABLED, backend=config.RATE_LIMIT_BACKEND, url=config.RATE_LIMIT_URL)
+    await broker.init(
+        backend=config.BROKER_BACKEND,
+        dsn=config.BROKER_URL,
+        max_queue=config.BROKER_QUEUE_SIZE,
+        max_subscribers=config.BROKER_MAX_SUBSCRIBERS,
+        health_interval=config.BROKER_HEALTH_INTERVAL,
+    )
+    await sessionmanager.warmup(config.DB_POOL_WARMUP)
+    token_sweeper = PeriodicTask("refresh-token-sweep", config.TOKEN_SWEEP_INTERVAL, token_store.sweep)
+    token_sweeper.start()
+    changes_compactor = PeriodicTask("todo-changes-compaction", config.TODO_CHANGES_COMPACT_INTERVAL,
+                                     compact_todo_changes)
+    changes_compactor.start()
+    if config.JOBS_ENABLED:
+        job_runner.start(
+            concurrency=config.JOBS_CONCURRENCY,
+            poll_interval=config.JOBS_POLL_INTERVAL,
+            timeout=config.JOBS_TIMEOUT,
+            stale_after=config.JOBS_STALE_SECONDS,
+            retry_base=config.JOBS_RETRY_BASE_SECONDS,
+            retry_max=config.JOBS_RETRY_MAX_SECONDS,
+        )
+    health.started = True
     yield
+    health.draining = True
+    await job_runner.stop()
+    await changes_compactor.stop()
+    await token_sweeper.stop()
+    await broker.close()
+    await limiter.close()
+    await cache.close()
+    password_hasher.close()
     if sessionmanager._engine is not None:
         await sessionmanager.close()
 
 
-app = FastAPI(title='Todo API by readyyyk', lifespan=lifespan)
+app = FastAPI(title='Todo API by readyyyk', lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Next-Cursor", "Retry-After", "ETag", "Last-Modified"],
 )
+app.add_middleware(TimingMiddleware, slow_request_seconds=config.SLOW_REQUEST_SECONDS)
 
 
 @app.get("/")
@@ -41,10 +119,13 @@ async def get():
 app.include_router(user_router, tags=["User"])
 app.include_router(todo_router, tags=["Todo"])
 app.include_router(auth_router, tags=["Auth"])
+app.include_router(share_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
 @app.exception_handler(JWTPayloadError)
-async def key_error_exception_handler(exc: JWTPayloadError):
+async def key_error_exception_handler(request: Request, exc: JWTPayloadError):
     return JSONResponse(
         status_code=418,
         content=exc.detail,
@@ -53,4 +134,5 @@ async def key_error_exception_handler(exc: JWTPayloadError):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT") or 8080), log_level=os.getenv("LOG_LEVEL"))
+    # single worker for local development, production runs server.py
+    uvicorn.run("main:app", host=config.HOST, port=config.PORT, log_level=config.LOG_LEVEL)
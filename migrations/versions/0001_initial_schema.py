@@ -0,0 +1,42 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(), nullable=False, unique=True),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('firstname', sa.String(), nullable=False),
+        sa.Column('lastname', sa.String(), nullable=False),
+        sa.Column('registered', sa.Date(), nullable=False, server_default=sa.func.now()),
+        sa.Column('image', sa.String(), nullable=False),
+    )
+    op.create_table(
+        'todos',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('description', sa.String(), nullable=False),
+        sa.Column('state', sa.Enum('done', 'active', 'passive', 'important', name='todo_state'),
+                  nullable=False, server_default='passive'),
+        sa.Column('created_at', sa.Date(), nullable=False, server_default=sa.text('NOW()')),
+    )
+
+
+def downgrade():
+    op.drop_table('todos')
+    op.drop_table('users')
+    sa.Enum(name='todo_state').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""todo owner indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY can't run inside a transaction, but doesn't lock todos against writes
+    with op.get_context().autocommit_block():
+        op.create_index('ix_todos_owner_created', 'todos', ['owner_id', 'created_at', 'id'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_todos_owner_state_created', 'todos', ['owner_id', 'state', 'created_at'],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_todos_owner_state_created', table_name='todos', postgresql_concurrently=True)
+        op.drop_index('ix_todos_owner_created', table_name='todos', postgresql_concurrently=True)
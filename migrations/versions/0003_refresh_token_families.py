@@ -0,0 +1,31 @@
+"""refresh token families
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'refresh_token_families',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('token_id', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(timezone=True)),
+    )
+    op.create_index('ix_refresh_token_families_user_id', 'refresh_token_families', ['user_id'])
+    op.create_index('ix_refresh_token_families_expires_at', 'refresh_token_families', ['expires_at'])
+
+
+def downgrade():
+    op.drop_table('refresh_token_families')
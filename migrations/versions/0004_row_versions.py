@@ -0,0 +1,33 @@
+"""row versions for conditional requests
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # constant and now() defaults are stored in the catalog, the tables aren't rewritten
+    for table in ('users', 'todos'):
+        op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False,
+                                       server_default=sa.func.now()))
+    op.add_column('users', sa.Column('todos_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('todos_updated_at', sa.DateTime(timezone=True), nullable=False,
+                                     server_default=sa.func.now()))
+
+
+def downgrade():
+    op.drop_column('users', 'todos_updated_at')
+    op.drop_column('users', 'todos_version')
+    for table in ('todos', 'users'):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
@@ -0,0 +1,35 @@
+"""todo change feed
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'todo_changes',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.Enum('upsert', 'delete', name='todo_change_operation'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_todo_changes_owner_id', 'todo_changes', ['owner_id', 'id'])
+    op.create_index('ix_todo_changes_todo_id', 'todo_changes', ['todo_id', 'id'])
+    op.create_index('ix_todo_changes_created_at', 'todo_changes', ['created_at'])
+    op.add_column('users', sa.Column('changes_compacted_seq', sa.BigInteger(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('users', 'changes_compacted_seq')
+    op.drop_table('todo_changes')
+    sa.Enum(name='todo_change_operation').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""todo description search index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gin lets owner_id live in the same GIN index, so a search never scans other users' todos
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    with op.get_context().autocommit_block():
+        op.create_index('ix_todos_owner_search', 'todos',
+                        ['owner_id', sa.text("to_tsvector('simple'::regconfig, description)")],
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_todos_owner_search', table_name='todos', postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""background jobs and soft-deleted users
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(), nullable=False, server_default='{}'),
+        sa.Column('status', sa.Enum('queued', 'running', 'failed', name='job_status'), nullable=False,
+                  server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('locked_at', sa.DateTime(timezone=True)),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_jobs_queued_run_at', 'jobs', ['run_at'], postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_jobs_running_locked_at', 'jobs', ['locked_at'],
+                    postgresql_where=sa.text("status = 'running'"))
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(timezone=True)))
+
+
+def downgrade():
+    op.drop_column('users', 'deleted_at')
+    op.drop_table('jobs')
+    sa.Enum(name='job_status').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,85 @@
+from datetime import datetime
+from enum import Enum as NativeEnum
+from sqlalchemy import Column, BigInteger, Integer, DateTime, Enum, Index, select, insert, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.crud import CRUD
+from services.database import Base
+
+
+class TodoChangeOperation(str, NativeEnum):
+    upsert = 'upsert'
+    delete = 'delete'
+
+
+class TodoChange(CRUD, Base):
+    __tablename__ = 'todo_changes'
+    # doubles as the per-owner change sequence
+    id = Column(BigInteger, primary_key=True)
+    owner_id = Column(Integer, nullable=False)
+    todo_id = Column(Integer, nullable=False)
+    operation = Column(Enum(TodoChangeOperation, name="todo_change_operation"), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_todo_changes_owner_id', owner_id, id),
+        Index('ix_todo_changes_todo_id', todo_id, id),
+        Index('ix_todo_changes_created_at', created_at),
+    )
+
+    @classmethod
+    async def record(cls, session: AsyncSession, operation: TodoChangeOperation, rows: list):
+        await session.execute(insert(cls).values([
+            {"owner_id": row.owner_id, "todo_id": row.id, "operation": operation} for row in rows
+        ]))
+
+    @classmethod
+    async def get_since(cls, session: AsyncSession, owner_id: int, since: int, limit: int) -> list:
+        return (await session.execute(
+            select(cls.id, cls.todo_id, cls.operation)
+            .where(cls.owner_id == owner_id, cls.id > since)
+            .order_by(cls.id)
+            .limit(limit)
+        )).all()
+
+    @classmethod
+    async def last_seq(cls, session: AsyncSession, owner_id: int) -> int:
+        return (await session.execute(
+            select(func.coalesce(func.max(cls.id), 0)).where(cls.owner_id == owner_id)
+        )).scalar_one()
+
+    @classmethod
+    async def purge_chunk_for(cls, owner_id: int, session: AsyncSession, limit: int) -> int:
+        purged = (await session.execute(
+            delete(cls).where(cls.id.in_(select(cls.id).where(cls.owner_id == owner_id).limit(limit)))
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        await session.commit()
+        return purged
+
+    @classmethod
+    async def compact(cls, session: AsyncSession, before: datetime):
+        # every worker schedules compaction, only one of them runs it at a time
+        locked = (await session.execute(
+            select(func.pg_try_advisory_xact_lock(func.hashtext(cls.__tablename__)))
+        )).scalar_one()
+        if not locked:
+            await session.rollback()
+            return
+        # drops changes superseded by a newer one for the same todo, and tombstones older than `before`;
+        # owners whose tombstones are gone get their changes_compacted_seq raised so stale cursors are reset
+        await session.execute(text("""
+            WITH superseded AS (
+                DELETE FROM todo_changes AS old USING todo_changes AS new
+                WHERE new.todo_id = old.todo_id AND new.id > old.id AND old.created_at < :before
+                RETURNING old.id
+            ), tombstones AS (
+                DELETE FROM todo_changes
+                WHERE operation = 'delete' AND created_at < :before
+                RETURNING owner_id, id
+            )
+            UPDATE users SET changes_compacted_seq = GREATEST(users.changes_compacted_seq, compacted.seq)
+            FROM (SELECT owner_id, max(id) AS seq FROM tombstones GROUP BY owner_id) AS compacted
+            WHERE users.id = compacted.owner_id
+        """), {"before": before})
+        await session.commit()
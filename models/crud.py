@@ -1,22 +1,78 @@
 from fastapi import HTTPException
+from sqlalchemy import insert, update, delete, select, inspect, func
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any
 
+from services.cache import cache
+
 
 class CRUD:
+    __cache_exclude__: tuple[str, ...] = ()
+
+    @classmethod
+    def cache_key(cls, id: int) -> str:
+        return f"{cls.__tablename__}:{id}"
+
+    @classmethod
+    async def invalidate(cls, *ids: int):
+        await cache.delete(*(cls.cache_key(id) for id in ids))
+
+    @classmethod
+    def cached_columns(cls) -> list:
+        return [column for column in cls.__table__.columns if column.key not in cls.__cache_exclude__]
+
+    @classmethod
+    def visible_criteria(cls) -> tuple:
+        # extra filters for rows that still exist but must not be served, e.g. soft-deleted ones
+        return ()
+
+    @classmethod
+    def version_values(cls) -> dict:
+        if "version" not in cls.__table__.c:
+            return {}
+        return {"version": cls.version + 1, "updated_at": func.now()}
+
+    @classmethod
+    async def after_write(cls, session: AsyncSession, operation: str, rows: list):
+        # runs inside the write transaction, right before commit
+        pass
+
+    def as_dict(self, exclude: tuple[str, ...] = ()) -> dict:
+        return {
+            attr.key: getattr(self, attr.key)
+            for attr in inspect(self).mapper.column_attrs
+            if attr.key not in exclude
+        }
+
     @classmethod
     async def create(cls: Any, session: AsyncSession, **kwargs):
-        transaction = cls(**kwargs)
-        session.add(transaction)
         try:
+            transaction = (await session.scalars(
+                insert(cls).values(**kwargs).returning(cls)
+            )).one()
+            await cls.after_write(session, "create", [transaction])
             await session.commit()
-            await session.refresh(transaction)
         except IntegrityError as e:
             await session.rollback()
             raise Exception("IntegrityError on creating " + cls.__name__)
         return transaction
 
+    @classmethod
+    async def create_many(cls: Any, session: AsyncSession, rows: list[dict]) -> list:
+        if not rows:
+            return []
+        try:
+            transactions = (await session.scalars(
+                insert(cls).values(rows).returning(cls)
+            )).all()
+            await cls.after_write(session, "create", transactions)
+            await session.commit()
+        except IntegrityError as e:
+            await session.rollback()
+            raise Exception("IntegrityError on creating " + cls.__name__)
+        return transactions
+
     @classmethod
     async def get(cls, session: AsyncSession, id: int):
         try:
@@ -25,37 +81,110 @@ class CRUD:
         except NoResultFound:
             return None
 
+    @classmethod
+    async def get_cached(cls, session: AsyncSession, id: int) -> dict | None:
+        key = cls.cache_key(id)
+        data = await cache.get(key)
+        if data is None:
+            row = (await session.execute(
+                select(*cls.cached_columns()).where(cls.id == id, *cls.visible_criteria())
+            )).mappings().first()
+            if row is None:
+                return None
+            data = dict(row)
+            # a replica may still return the row a write just invalidated, only the primary fills the cache
+            if not session.info.get("replica"):
+                await cache.set(key, data)
+        return data
+
     async def delete_inst(self, session: AsyncSession) -> bool:
+        if self is None:
+            return False
+        return await type(self).delete_where(session, self.id)
+
+    @classmethod
+    async def delete(cls, session: AsyncSession, id: int) -> bool:
+        return await cls.delete_where(session, id)
+
+    @classmethod
+    async def delete_where(cls, session: AsyncSession, id: int, *criteria) -> bool:
         try:
-            if self is None:
-                return False
-            await session.delete(self)
+            deleted = (await session.execute(
+                delete(cls).where(cls.id == id, *criteria).returning(*cls.__table__.c)
+            )).first()
+            if deleted is not None:
+                await cls.after_write(session, "delete", [deleted])
             await session.commit()
         except Exception as e:
             await session.rollback()
             raise e
-        return True
+        if deleted is not None:
+            await cls.invalidate(id)
+        return deleted is not None
 
     @classmethod
-    async def delete(cls, session: AsyncSession, id: int) -> bool:
-        transaction = await cls.get(session, id)
-        return await transaction.delete_inst(session)
-
-    async def update_inst(self, session: AsyncSession, **kwargs):
+    async def delete_many(cls, session: AsyncSession, ids: list[int], *criteria) -> set[int]:
+        if not ids:
+            return set()
         try:
-            if self is None:
-                raise HTTPException(status_code=404, detail=self.__name__+" not found!")
-            for key in kwargs:
-                setattr(self, key, kwargs[key])
+            deleted = (await session.execute(
+                delete(cls).where(cls.id.in_(ids), *criteria).returning(*cls.__table__.c)
+            )).all()
+            if deleted:
+                await cls.after_write(session, "delete", deleted)
             await session.commit()
-            await session.refresh(self)
-            return self
         except Exception as e:
             await session.rollback()
             raise e
+        await cls.invalidate(*(row.id for row in deleted))
+        return {row.id for row in deleted}
+
+    async def update_inst(self, session: AsyncSession, **kwargs):
+        if self is None:
+            raise HTTPException(status_code=404, detail="Record not found!")
+        return await type(self).update_where(session, self.id, **kwargs)
 
     @classmethod
     async def update(cls, session: AsyncSession, id: int, **kwargs):
-        transaction = await cls.get(session, id)
-        updated = await cls.update_inst(transaction, session, **kwargs)
+        updated = await cls.update_where(session, id, *cls.visible_criteria(), **kwargs)
+        if updated is None:
+            raise HTTPException(status_code=404, detail=cls.__name__ + " not found!")
         return updated
+
+    @classmethod
+    async def update_where(cls, session: AsyncSession, id: int, *criteria, **kwargs):
+        if not kwargs:
+            return (await session.scalars(select(cls).where(cls.id == id, *criteria))).first()
+        try:
+            transaction = (await session.scalars(
+                update(cls).where(cls.id == id, *criteria).values(**kwargs, **cls.version_values()).returning(cls)
+                .execution_options(populate_existing=True)
+            )).first()
+            if transaction is not None:
+                await cls.after_write(session, "update", [transaction])
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        await cls.invalidate(id)
+        return transaction
+
+    @classmethod
+    async def update_many(cls, session: AsyncSession, changes: list[tuple[list[int], dict]], *criteria) -> list:
+        transactions, updated = [], []
+        try:
+            for ids, values in changes:
+                if not values:
+                    transactions.extend((await session.scalars(select(cls).where(cls.id.in_(ids), *criteria))).all())
+                    continue
+                query = (update(cls).where(cls.id.in_(ids), *criteria).values(**values, **cls.version_values())
+                         .returning(cls).execution_options(populate_existing=True))
+                updated.extend((await session.scalars(query)).all())
+            if updated:
+                await cls.after_write(session, "update", updated)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        await cls.invalidate(*(transaction.id for transaction in updated))
+        return transactions + updated
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from enum import Enum as NativeEnum
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, Enum, Index, select, insert, update, \
+    delete, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.crud import CRUD
+from services.database import Base
+
+
+class JobStatus(str, NativeEnum):
+    queued = 'queued'
+    running = 'running'
+    failed = 'failed'
+
+
+class Job(CRUD, Base):
+    __tablename__ = 'jobs'
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False, server_default='{}')
+    status = Column(Enum(JobStatus, name="job_status"), nullable=False, server_default=JobStatus.queued)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    max_attempts = Column(Integer, nullable=False, server_default='5')
+    run_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # claiming only ever looks at due queued jobs, finished ones are deleted and failed ones kept aside
+        Index('ix_jobs_queued_run_at', run_at, postgresql_where=text("status = 'queued'")),
+        Index('ix_jobs_running_locked_at', locked_at, postgresql_where=text("status = 'running'")),
+    )
+
+    @classmethod
+    async def enqueue(cls, session: AsyncSession, kind: str, payload: dict, max_attempts: int = 5,
+                      delay: float = 0):
+        # joins the caller's transaction, the job only becomes visible once the caller commits
+        values = {"kind": kind, "payload": payload, "max_attempts": max_attempts}
+        if delay > 0:
+            values["run_at"] = func.now() + timedelta(seconds=delay)
+        await session.execute(insert(cls).values(**values))
+
+    @classmethod
+    async def claim(cls, session: AsyncSession, limit: int) -> list:
+        due = select(cls.id).where(cls.status == JobStatus.queued, cls.run_at <= func.now()) \
+            .order_by(cls.run_at).limit(limit).with_for_update(skip_locked=True)
+        jobs = (await session.execute(
+            update(cls).where(cls.id.in_(due.scalar_subquery()))
+            .values(status=JobStatus.running, locked_at=func.now(), attempts=cls.attempts + 1)
+            .returning(cls.id, cls.kind, cls.payload, cls.attempts, cls.max_attempts)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await session.commit()
+        return jobs
+
+    @classmethod
+    async def complete(cls, session: AsyncSession, id: int):
+        await session.execute(delete(cls).where(cls.id == id).execution_options(synchronize_session=False))
+        await session.commit()
+
+    @classmethod
+    async def reschedule(cls, session: AsyncSession, id: int, delay: float = 0, error: str | None = None,
+                         failed: bool = False, count_attempt: bool = True):
+        values = {
+            "status": JobStatus.failed if failed else JobStatus.queued,
+            "run_at": func.now() + timedelta(seconds=delay),
+            "locked_at": None,
+            "last_error": error,
+        }
+        if not count_attempt:
+            values["attempts"] = cls.attempts - 1
+        await session.execute(
+            update(cls).where(cls.id == id).values(**values).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    @classmethod
+    async def recover_stale(cls, session: AsyncSession, stale_after: float) -> int:
+        # jobs of a worker that died mid-run go back to the queue, their attempt stays counted
+        recovered = (await session.execute(
+            update(cls)
+            .where(cls.status == JobStatus.running, cls.locked_at < func.now() - timedelta(seconds=stale_after))
+            .values(status=JobStatus.queued, locked_at=None, last_error="Recovered after worker timeout")
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        await session.commit()
+        return recovered
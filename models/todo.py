@@ -1,9 +1,15 @@
+from datetime import date, datetime, timezone
 from enum import Enum as NativeEnum
-from sqlalchemy import Column, Integer, String, Date, Enum, ForeignKey, select, inspect
+from typing import AsyncIterator
+from sqlalchemy import Column, Integer, String, Date, DateTime, Double, Enum, ForeignKey, Index, select, inspect, tuple_, \
+    cast, func, literal_column, delete, event, DDL
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import relationship, joinedload
 
+from models.change import TodoChange, TodoChangeOperation
 from models.crud import CRUD
+from models.user import User
 from services.database import Base
 
 
@@ -14,6 +20,12 @@ class TodoState(str, NativeEnum):
     important = 'important'
 
 
+# has to match the indexed expression exactly, a bound config name would skip the index
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+# the todo schemas reject control characters in descriptions, views turn these into markup after escaping
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\x02", "\x03"
+
+
 class Todo(CRUD, Base):
     __tablename__ = 'todos'
     id = Column(Integer, primary_key=True)
@@ -21,6 +33,25 @@ class Todo(CRUD, Base):
     description = Column(String, nullable=False)
     state = Column(Enum(TodoState, name="todo_state"), nullable=False, server_default=TodoState.passive)
     created_at = Column(Date, nullable=False, server_default='NOW()')
+    version = Column(Integer, nullable=False, server_default='0')
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    owner = relationship("User", back_populates="todos", lazy="raise")
+
+    __table_args__ = (
+        Index('ix_todos_owner_created', owner_id, created_at, id),
+        Index('ix_todos_owner_state_created', owner_id, state, created_at),
+        Index('ix_todos_owner_search', owner_id, func.to_tsvector(SEARCH_CONFIG, description),
+              postgresql_using='gin'),
+    )
+
+    @classmethod
+    async def after_write(cls, session: AsyncSession, operation: str, rows: list):
+        # locks the owners' rows first, so change sequence numbers commit in order for every owner
+        await User.bump_todos_version(session, {row.owner_id for row in rows})
+        await TodoChange.record(
+            session, TodoChangeOperation.delete if operation == "delete" else TodoChangeOperation.upsert, rows
+        )
 
     @classmethod
     async def get_by_owner(cls, session: AsyncSession, owner_id: int):
@@ -33,7 +64,203 @@ class Todo(CRUD, Base):
             return transaction
         return transaction
 
+    @classmethod
+    async def get_with_owner(cls, session: AsyncSession, id: int, *criteria):
+        return (await session.scalars(
+            select(cls).options(joinedload(cls.owner)).where(cls.id == id, *criteria)
+        )).first()
+
+    @classmethod
+    async def get_many_with_owner(cls, session: AsyncSession, ids: list[int], *criteria) -> list:
+        return (await session.scalars(
+            select(cls).options(joinedload(cls.owner)).where(cls.id.in_(ids), *criteria)
+        )).all()
+
+    @classmethod
+    def row_columns(cls) -> tuple:
+        # created_at is served as a datetime, the same way TodoSchema renders it
+        return cls.id, cls.owner_id, cls.description, cls.state, cast(cls.created_at, DateTime).label("created_at")
+
+    @classmethod
+    async def get_rows_for(cls, owner_id: int, session: AsyncSession, ids: list[int]) -> list:
+        return (await session.execute(
+            select(*cls.row_columns()).where(cls.id.in_(ids), cls.owner_id == owner_id)
+        )).mappings().all()
+
+    @classmethod
+    def owner_query(cls, owner_id: int,
+                    state: TodoState | None = None,
+                    created_from: date | None = None,
+                    created_to: date | None = None):
+        query = select(*cls.row_columns()).where(cls.owner_id == owner_id)
+        if state is not None:
+            query = query.where(cls.state == state)
+        if created_from is not None:
+            query = query.where(cls.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(cls.created_at <= created_to)
+        return query.order_by(cls.created_at.desc(), cls.id.desc())
+
+    @classmethod
+    async def get_page_by_owner(cls, session: AsyncSession, owner_id: int, limit: int,
+                                after: tuple[date, int] | None = None, **filters):
+        query = cls.owner_query(owner_id, **filters)
+        if after is not None:
+            query = query.where(tuple_(cls.created_at, cls.id) < tuple_(*after))
+        rows = (await session.execute(query.limit(limit + 1))).mappings().all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, (rows[-1]["created_at"].date(), rows[-1]["id"])
+        return rows, None
+
+    @classmethod
+    async def stream_by_owner(cls, session: AsyncSession, owner_id: int,
+                              batch_size: int = 500, **filters) -> AsyncIterator:
+        query = cls.owner_query(owner_id, **filters).execution_options(yield_per=batch_size)
+        result = await session.stream(query)
+        async for row in result.mappings():
+            yield row
+
+    @classmethod
+    async def get_stats(cls, session: AsyncSession, owner_id: int,
+                        created_from: date | None = None, created_to: date | None = None) -> dict:
+        criteria = [cls.owner_id == owner_id]
+        if created_from is not None:
+            criteria.append(cls.created_at >= created_from)
+        if created_to is not None:
+            criteria.append(cls.created_at <= created_to)
+        # both groupings are index-only scans over the owner indexes
+        states = dict((await session.execute(
+            select(cls.state, func.count()).where(*criteria).group_by(cls.state)
+        )).all())
+        days = (await session.execute(
+            select(cls.created_at, func.count()).where(*criteria)
+            .group_by(cls.created_at).order_by(cls.created_at)
+        )).all()
+        return {
+            "total": sum(states.values()),
+            "states": {state.value: states.get(state, 0) for state in TodoState},
+            "days": [{"day": day, "count": count} for day, count in days],
+        }
+
+    @classmethod
+    async def search_by_owner(cls, session: AsyncSession, owner_id: int, text: str, limit: int,
+                              after: tuple[float, int] | None = None):
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+        rank = cast(func.ts_rank_cd(func.to_tsvector(SEARCH_CONFIG, cls.description), ts_query), Double)
+        matches = select(cls.id, rank.label("rank")).where(
+            cls.owner_id == owner_id,
+            func.to_tsvector(SEARCH_CONFIG, cls.description).op("@@")(ts_query),
+        )
+        if after is not None:
+            matches = matches.where(tuple_(rank, cls.id) < tuple_(*after))
+        page = matches.order_by(rank.desc(), cls.id.desc()).limit(limit + 1).subquery()
+        # ts_headline reparses the text, so it only runs for the rows of the page
+        headline = func.ts_headline(
+            SEARCH_CONFIG, cls.description, ts_query,
+            f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2"
+        )
+        query = select(*cls.row_columns(), page.c.rank, headline.label("highlight")) \
+            .join(page, page.c.id == cls.id) \
+            .order_by(page.c.rank.desc(), page.c.id.desc())
+        rows = (await session.execute(query)).mappings().all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, (rows[-1]["rank"], rows[-1]["id"])
+        return rows, None
+
     @classmethod
     async def create_for(cls, owner_id: int, session: AsyncSession, **kwargs):
         payload = {**kwargs, "owner_id": owner_id}
         return await super().create(session, **payload)
+
+    @classmethod
+    async def create_many_for(cls, owner_id: int, session: AsyncSession, rows: list[dict]) -> list:
+        return await cls.create_many(session, [{**row, "owner_id": owner_id} for row in rows])
+
+    @classmethod
+    async def update_many_for(cls, owner_id: int, session: AsyncSession, items: list[dict]) -> list:
+        changes: dict[tuple, list[int]] = {}
+        for item in items:
+            values = {key: value for key, value in item.items() if key != "id"}
+            changes.setdefault(tuple(sorted(values.items())), []).append(item["id"])
+        return await cls.update_many(
+            session, [(ids, dict(values)) for values, ids in changes.items()], cls.owner_id == owner_id
+        )
+
+    @classmethod
+    async def delete_many_for(cls, owner_id: int, session: AsyncSession, ids: list[int]) -> set[int]:
+        return await cls.delete_many(session, ids, cls.owner_id == owner_id)
+
+    @classmethod
+    async def update_for(cls, owner_id: int, session: AsyncSession, id: int, **kwargs):
+        return await cls.update_where(session, id, cls.owner_id == owner_id, **kwargs)
+
+    @classmethod
+    async def import_chunk_for(cls, owner_id: int, session: AsyncSession, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        # COPY doesn't apply server defaults to the columns it is given
+        today = datetime.now(timezone.utc).date()
+        try:
+            await User.bump_todos_version(session, {owner_id})
+            # COPY skips the per-row change feed, clients holding a cursor refetch /todos/my instead
+            await User.reset_changes(session, {owner_id})
+            connection = await (await session.connection()).get_raw_connection()
+            await connection.driver_connection.copy_records_to_table(
+                cls.__tablename__,
+                columns=["owner_id", "description", "state", "created_at"],
+                records=[(owner_id, row["description"], row["state"].value, row["created_at"] or today)
+                         for row in rows],
+            )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        return len(rows)
+
+    @classmethod
+    async def purge_chunk_for(cls, owner_id: int, session: AsyncSession, limit: int) -> int:
+        # the owner is being deleted, so no change feed entries or version bumps are recorded
+        ids = (await session.execute(
+            delete(cls).where(cls.id.in_(select(cls.id).where(cls.owner_id == owner_id).limit(limit)))
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )).scalars().all()
+        await session.commit()
+        await cls.invalidate(*ids)
+        return len(ids)
+
+    @classmethod
+    async def purge_owner(cls, owner_id: int, session: AsyncSession) -> bool:
+        # sweeps up whatever the chunks missed in the transaction that deletes the owner row
+        try:
+            locked = (await session.execute(
+                select(User.id).where(User.id == owner_id, User.deleted_at.is_not(None)).with_for_update()
+            )).first()
+            if locked is None:
+                await session.rollback()
+                return False
+            ids = (await session.execute(
+                delete(cls).where(cls.owner_id == owner_id).returning(cls.id)
+                .execution_options(synchronize_session=False)
+            )).scalars().all()
+            await session.execute(
+                delete(TodoChange).where(TodoChange.owner_id == owner_id).execution_options(synchronize_session=False)
+            )
+            # refresh token families go with the row through their ON DELETE CASCADE
+            await session.execute(delete(User).where(User.id == owner_id).execution_options(synchronize_session=False))
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        await cls.invalidate(*ids)
+        return True
+
+    @classmethod
+    async def delete_for(cls, owner_id: int, session: AsyncSession, id: int) -> bool:
+        return await cls.delete_where(session, id, cls.owner_id == owner_id)
+
+
+# ix_todos_owner_search puts an integer column in a GIN index, metadata.create_all needs btree_gin as well
+event.listen(Todo.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS btree_gin"))
@@ -0,0 +1,51 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, update, delete, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.crud import CRUD
+from services.database import Base
+
+
+class RefreshTokenFamily(CRUD, Base):
+    __tablename__ = 'refresh_token_families'
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_id = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True))
+
+    @classmethod
+    async def rotate(cls, session: AsyncSession, id: str, token_id: str, new_token_id: str,
+                     expires_at: datetime) -> bool:
+        rotated = (await session.execute(
+            update(cls)
+            .where(cls.id == id, cls.token_id == token_id, cls.revoked_at.is_(None), cls.expires_at > func.now())
+            .values(token_id=new_token_id, expires_at=expires_at)
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if rotated is None:
+            # an already rotated token came back: the family is compromised
+            await session.execute(
+                update(cls).where(cls.id == id, cls.revoked_at.is_(None)).values(revoked_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+        return rotated is not None
+
+    @classmethod
+    async def revoke(cls, session: AsyncSession, *criteria):
+        await session.execute(
+            update(cls).where(*criteria, cls.revoked_at.is_(None)).values(revoked_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    @classmethod
+    async def sweep(cls, session: AsyncSession) -> int:
+        deleted = (await session.execute(
+            delete(cls).where(or_(cls.expires_at <= func.now(), cls.revoked_at.is_not(None)))
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        await session.commit()
+        return deleted
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import urllib.parse
-from sqlalchemy import Column, Integer, String, Date, func, select
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, func, select, update
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-import bcrypt
+from sqlalchemy.orm import relationship
 
 from models.crud import CRUD
+from models.job import Job
 from services.database import Base
+from services.passwords import password_hasher
 
 
 def default_image(context):
@@ -16,6 +19,7 @@ def default_image(context):
 
 class User(Base, CRUD):
     __tablename__ = 'users'
+    __cache_exclude__ = ("password", "todos_version", "todos_updated_at", "changes_compacted_seq", "deleted_at")
     id = Column(Integer, primary_key=True)
     username = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
@@ -24,34 +28,106 @@ class User(Base, CRUD):
     lastname = Column(String, nullable=False)
     registered = Column(Date, nullable=False, server_default=func.now())
     image = Column(String, nullable=False, default=default_image)
+    version = Column(Integer, nullable=False, server_default='0')
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # bumped on every write to the user's todos, lets /todos/my answer conditional requests
+    todos_version = Column(Integer, nullable=False, server_default='0')
+    todos_updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # todo changes up to this sequence may have been compacted away
+    changes_compacted_seq = Column(BigInteger, nullable=False, server_default='0')
+    # set on account deletion, the purge_user job removes the row and everything it owns afterwards
+    deleted_at = Column(DateTime(timezone=True))
+
+    todos = relationship("Todo", back_populates="owner", lazy="raise", passive_deletes=True)
 
     @classmethod
     async def create(cls, session: AsyncSession, **kwargs) -> User:
-        kwargs["password"] = kwargs["password"].encode('utf-8')
-        kwargs["password"] = bcrypt.hashpw(kwargs["password"], bcrypt.gensalt()).decode('utf-8')
+        kwargs["password"] = await password_hasher.hash(kwargs["password"])
         return await super().create(session, **kwargs)
 
     @classmethod
     async def update(cls, session: AsyncSession, id: int, **kwargs) -> User:
         if "password" in kwargs.keys():
-            kwargs["password"] = kwargs["password"].encode('utf-8')
-            kwargs["password"] = bcrypt.hashpw(kwargs["password"], bcrypt.gensalt()).decode('utf-8')
+            kwargs["password"] = await password_hasher.hash(kwargs["password"])
         return await super().update(session, id, **kwargs)
 
+    @classmethod
+    def visible_criteria(cls) -> tuple:
+        return (cls.deleted_at.is_(None),)
+
+    @classmethod
+    async def mark_deleted(cls, session: AsyncSession, id: int, max_attempts: int = 5) -> bool:
+        deleted = (await session.execute(
+            update(cls).where(cls.id == id, cls.deleted_at.is_(None))
+            .values(deleted_at=func.now(), **cls.version_values())
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if deleted is None:
+            await session.rollback()
+            return False
+        await Job.enqueue(session, "purge_user", {"user_id": id}, max_attempts=max_attempts)
+        await session.commit()
+        await cls.invalidate(id)
+        return True
+
     @classmethod
     async def login(cls, session: AsyncSession, username: str, password: str) -> User | None:
         try:
             user = (await session.execute(select(cls).where(
-                cls.username == username
+                cls.username == username, *cls.visible_criteria()
             ))).scalars().first()
 
             if user is None:
                 return None
 
-            is_valid = bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8'))
+            is_valid = await password_hasher.verify(password, user.password)
             if is_valid:
                 return user
             else:
                 return None
         except NoResultFound:
             return None
+
+    @classmethod
+    async def replace_password_hash(cls, session: AsyncSession, id: int, old_hash: str, new_hash: str) -> bool:
+        # same password, so version and cached data stay as they are; skipped if the password changed meanwhile
+        result = await session.execute(
+            update(cls).where(cls.id == id, cls.password == old_hash).values(password=new_hash)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+    @classmethod
+    async def get_todos_version(cls, session: AsyncSession, id: int):
+        return (await session.execute(select(cls.todos_version, cls.todos_updated_at).where(
+            cls.id == id
+        ))).first()
+
+    @classmethod
+    async def bump_todos_version(cls, session: AsyncSession, ids: set[int]):
+        # access tokens outlive account deletion, so writes for a deleted owner are refused here, under the row lock
+        bumped = (await session.execute(
+            update(cls).where(cls.id.in_(ids), *cls.visible_criteria())
+            .values(todos_version=cls.todos_version + 1, todos_updated_at=func.now())
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )).scalars().all()
+        if len(bumped) < len(ids):
+            raise HTTPException(status_code=404, detail="User not found!")
+
+    @classmethod
+    async def reset_changes(cls, session: AsyncSession, ids: set[int]):
+        # a fresh sequence value is above every cursor handed out so far, so all of them get reset
+        await session.execute(
+            update(cls).where(cls.id.in_(ids))
+            .values(changes_compacted_seq=func.nextval(func.pg_get_serial_sequence("todo_changes", "id")))
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    async def get_changes_compacted_seq(cls, session: AsyncSession, id: int) -> int | None:
+        return (await session.execute(select(cls.changes_compacted_seq).where(
+            cls.id == id
+        ))).scalar_one_or_none()
@@ -0,0 +1,67 @@
+"""Production entry point: `python server.py` runs main:app on WEB_CONCURRENCY workers."""
+import importlib.util
+import logging
+import time
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from config import config
+from services.health import health
+from utils.log import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class Server(uvicorn.Server):
+    """Fails readiness for DRAIN_SECONDS after SIGTERM before uvicorn's own graceful shutdown,
+    so the load balancer stops routing to this worker while it still accepts requests."""
+
+    drain_until: float | None = None
+
+    def handle_exit(self, sig, frame):
+        if config.DRAIN_SECONDS <= 0 or self.drain_until is not None:
+            return super().handle_exit(sig, frame)
+        health.draining = True
+        self.drain_until = time.monotonic() + config.DRAIN_SECONDS
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.drain_until is not None and time.monotonic() >= self.drain_until:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+def main():
+    configure_logging(config.LOG_LEVEL)
+    if config.WEB_CONCURRENCY > 1 and config.PROCESS_LOCAL_BACKENDS:
+        logger.warning(
+            "Running several workers with process-local backends, their state isn't shared between workers",
+            extra={"workers": config.WEB_CONCURRENCY, "backends": config.PROCESS_LOCAL_BACKENDS},
+        )
+    server_config = uvicorn.Config(
+        "main:app",
+        host=config.HOST,
+        port=config.PORT,
+        workers=config.WEB_CONCURRENCY,
+        loop="uvloop" if available("uvloop") else "asyncio",
+        http="httptools" if available("httptools") else "h11",
+        log_level=config.LOG_LEVEL,
+        access_log=config.ACCESS_LOG,
+        proxy_headers=True,
+        forwarded_allow_ips=config.FORWARDED_ALLOW_IPS,
+        timeout_keep_alive=config.KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=config.GRACEFUL_SHUTDOWN_SECONDS,
+    )
+    server = Server(server_config)
+    if server_config.workers > 1:
+        Multiprocess(server_config, target=server.run, sockets=[server_config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Security
+from fastapi.security import APIKeyCookie, HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+from config import config, jwt_config
+from utils import JWTPayloadError
+
+
+class AccessTokenCache:
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> dict | None:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, subject = entry
+        if expires_at <= time.time():
+            self._entries.pop(digest, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return subject
+
+    def set(self, digest: bytes, subject: dict, expires_at: float):
+        self._entries[digest] = (expires_at, subject)
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+token_cache = AccessTokenCache(config.ACCESS_TOKEN_CACHE_SIZE)
+
+access_bearer = HTTPBearer(auto_error=False)
+access_cookie = APIKeyCookie(name="access_token_cookie", auto_error=False)
+
+
+def decode_access_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, jwt_config.access_security.secret_key,
+                             algorithms=[jwt_config.access_security.algorithm])
+    except JWTError as e:
+        raise HTTPException(status_code=401, detail=f"Wrong token: {e}")
+    if payload.get("type") != "access":
+        raise HTTPException(status_code=401, detail="Wrong token: 'type' is not 'access'")
+    return payload
+
+
+def verify_access_token(token: str) -> dict:
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    subject = token_cache.get(digest)
+    if subject is None:
+        payload = decode_access_token(token)
+        subject = payload["subject"]
+        token_cache.set(digest, subject, payload["exp"])
+    return subject
+
+
+async def get_current_user_id(bearer: HTTPAuthorizationCredentials | None = Security(access_bearer),
+                              cookie: str | None = Security(access_cookie)) -> int:
+    token = bearer.credentials if bearer is not None else cookie
+    if token is None:
+        raise HTTPException(status_code=401, detail="Credentials are not provided")
+    subject = verify_access_token(token)
+    try:
+        return int(subject["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise JWTPayloadError(detail=f"Invalid token subject: {e}")
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# postgres NOTIFY payloads must stay below 8000 bytes
+MAX_NOTIFY_PAYLOAD = 7900
+
+
+class Subscription:
+    def __init__(self, owner_id: int, max_queue: int):
+        self.owner_id = owner_id
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(max_queue)
+        self.closed = False
+
+    def push(self, payload: bytes) -> bool:
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        # wakes up the consumer waiting on get()
+        self.queue.put_nowait(None)
+
+
+class InProcessBroker:
+    def __init__(self, max_queue: int = 100, max_subscribers: int = 50000):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self.subscriber_count = 0
+        self.dropped = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.close()
+        self._subscribers.clear()
+        self.subscriber_count = 0
+
+    def subscribe(self, owner_id: int) -> Subscription | None:
+        if self.subscriber_count >= self.max_subscribers:
+            return None
+        subscription = Subscription(owner_id, self.max_queue)
+        self._subscribers.setdefault(owner_id, set()).add(subscription)
+        self.subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.owner_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.owner_id]
+        self.subscriber_count -= 1
+        subscription.close()
+
+    def deliver(self, owner_id: int, payload: bytes):
+        for subscription in list(self._subscribers.get(owner_id, ())):
+            if not subscription.push(payload):
+                # slow consumer, its stream ends and the client reconnects
+                self.dropped += 1
+                self.unsubscribe(subscription)
+
+    def deliver_all(self, payload: bytes):
+        for owner_id in list(self._subscribers):
+            self.deliver(owner_id, payload)
+
+    async def publish(self, owner_id: int, events: list[dict]):
+        for event in events:
+            self.deliver(owner_id, orjson.dumps(event))
+
+
+def notify_payloads(owner_id: int, events: list[dict]) -> list[str]:
+    """Packs events into as few NOTIFY payloads as the size limit allows."""
+    prefix = f"{owner_id}:"
+    payloads, batch, size = [], [], len(prefix) + 2
+    for event in events:
+        encoded = orjson.dumps(event)
+        if len(prefix) + len(encoded) + 2 > MAX_NOTIFY_PAYLOAD and "todo" in event:
+            # clients refetch the todo by id
+            encoded = orjson.dumps({**event, "todo": None})
+        if batch and size + len(encoded) + 1 > MAX_NOTIFY_PAYLOAD:
+            payloads.append(prefix + "[" + b",".join(batch).decode('utf-8') + "]")
+            batch, size = [], len(prefix) + 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        payloads.append(prefix + "[" + b",".join(batch).decode('utf-8') + "]")
+    return payloads
+
+
+class PostgresBroker(InProcessBroker):
+    channel = "todo_events"
+    # sent to every local subscriber after the listener reconnects, notifications may have been missed
+    RESET_EVENT = orjson.dumps({"operation": "reset", "todo_id": None, "todo": None})
+
+    def __init__(self, dsn: str, health_interval: float = 10.0, **kwargs):
+        super().__init__(**kwargs)
+        self.dsn = dsn.replace("+asyncpg", "")
+        self.health_interval = health_interval
+        self._listener = None
+        self._publisher = None
+        self._publish_lock = asyncio.Lock()
+        self._listener_lost = asyncio.Event()
+        self._supervisor: asyncio.Task | None = None
+
+    async def start(self):
+        await self._listen()
+        self._publisher = await self._connect()
+        self._supervisor = asyncio.create_task(self._supervise(), name="broker-listener")
+
+    async def _connect(self):
+        import asyncpg
+
+        return await asyncpg.connect(self.dsn)
+
+    async def _listen(self):
+        listener = await self._connect()
+        listener.add_termination_listener(lambda connection: self._listener_lost.set())
+        await listener.add_listener(self.channel, self._on_notify)
+        self._listener = listener
+        self._listener_lost.clear()
+
+    async def _listener_healthy(self) -> bool:
+        if self._listener is None or self._listener.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(self._listener.fetchval("SELECT 1"), self.health_interval)
+            return True
+        except Exception:
+            return False
+
+    async def _supervise(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._listener_lost.wait(), self.health_interval)
+            except asyncio.TimeoutError:
+                pass
+            if await self._listener_healthy():
+                continue
+            logger.warning("Todo event listener lost, reconnecting")
+            if self._listener is not None:
+                self._listener.terminate()
+                self._listener = None
+            try:
+                await self._listen()
+            except Exception:
+                logger.exception("Error reconnecting todo event listener")
+                continue
+            self.deliver_all(self.RESET_EVENT)
+
+    async def close(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+        self._supervisor = None
+        for connection in (self._listener, self._publisher):
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        self._listener = self._publisher = None
+        await super().close()
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        owner_id, _, events = payload.partition(":")
+        for event in orjson.loads(events):
+            self.deliver(int(owner_id), orjson.dumps(event))
+
+    async def publish(self, owner_id: int, events: list[dict]):
+        payloads = notify_payloads(owner_id, events)
+        if not payloads:
+            return
+        async with self._publish_lock:
+            if self._publisher is None or self._publisher.is_closed():
+                self._publisher = await self._connect()
+            # one round trip for the whole batch
+            await self._publisher.execute(
+                "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload", self.channel, payloads
+            )
+
+
+class Broker:
+    def __init__(self):
+        self._backend: InProcessBroker | None = None
+
+    async def init(self, backend: str = "memory", dsn: str | None = None, max_queue: int = 100,
+                   max_subscribers: int = 50000, health_interval: float = 10.0):
+        if backend == "postgres":
+            self._backend = PostgresBroker(dsn, health_interval=health_interval, max_queue=max_queue,
+                                           max_subscribers=max_subscribers)
+        else:
+            self._backend = InProcessBroker(max_queue=max_queue, max_subscribers=max_subscribers)
+        await self._backend.start()
+
+    async def close(self):
+        if self._backend is not None:
+            await self._backend.close()
+        self._backend = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._backend.subscriber_count if self._backend is not None else 0
+
+    @property
+    def dropped(self) -> int:
+        return self._backend.dropped if self._backend is not None else 0
+
+    def subscribe(self, owner_id: int) -> Subscription | None:
+        if self._backend is None:
+            return None
+        return self._backend.subscribe(owner_id)
+
+    def unsubscribe(self, subscription: Subscription):
+        if self._backend is not None:
+            self._backend.unsubscribe(subscription)
+
+    async def publish(self, owner_id: int, events: list[dict]):
+        if self._backend is None or not events:
+            return
+        try:
+            await self._backend.publish(owner_id, events)
+        except Exception:
+            # a lost event only delays clients until their next sync
+            logger.exception("Error publishing todo event", extra={"owner_id": owner_id})
+
+
+broker = Broker()
@@ -0,0 +1,136 @@
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any
+
+import orjson
+
+
+def _default(value):
+    # tagged so they come back as the same types, row mappings feed ETags and Last-Modified
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    raise TypeError
+
+
+def _restore(value):
+    if isinstance(value, dict):
+        if len(value) == 1:
+            if "$datetime" in value:
+                return datetime.fromisoformat(value["$datetime"])
+            if "$date" in value:
+                return date.fromisoformat(value["$date"])
+        return {key: _restore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_restore(item) for item in value]
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def loads(raw: bytes) -> Any:
+    return _restore(orjson.loads(raw))
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def close(self):
+        self._data.clear()
+
+
+class RedisBackend:
+    def __init__(self, url: str, prefix: str = "todos-api:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise Exception('CACHE_BACKEND=redis requires the "redis" package to be installed!')
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str):
+        raw = await self._client.get(self.prefix + key)
+        return loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._client.set(self.prefix + key, dumps(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*(self.prefix + key for key in keys))
+
+    async def close(self):
+        await self._client.close()
+
+
+class Cache:
+    def __init__(self):
+        self._backend: MemoryBackend | RedisBackend | None = None
+        self.ttl = 60.0
+        self.hits = 0
+        self.misses = 0
+
+    def init(self, backend: str = "memory", url: str | None = None, ttl: float = 60.0, max_entries: int = 10000):
+        if backend == "redis":
+            self._backend = RedisBackend(url)
+        elif backend == "memory":
+            self._backend = MemoryBackend(max_entries)
+        else:
+            self._backend = None
+        self.ttl = ttl
+
+    async def close(self):
+        if self._backend is not None:
+            await self._backend.close()
+        self._backend = None
+
+    async def get(self, key: str):
+        if self._backend is None:
+            return None
+        value = await self._backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float | None = None):
+        if self._backend is not None:
+            await self._backend.set(key, value, ttl or self.ttl)
+
+    async def delete(self, *keys: str):
+        if self._backend is not None:
+            await self._backend.delete(*keys)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+cache = Cache()
@@ -1,31 +1,132 @@
+import asyncio
 import contextlib
-from typing import AsyncIterator
+import time
+from typing import Any, AsyncIterator
 
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import (AsyncConnection,
                                     AsyncEngine,
+                                    AsyncSession,
                                     async_sessionmaker,
                                     create_async_engine)
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import Session, declarative_base
+
+from services.auth import get_current_user_id
+from services.instrumentation import instrument_engine, observe_checkout
 
 
 Base = declarative_base()
 
 
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(autocommit=False, expire_on_commit=False, bind=engine)
+        self.unhealthy_until = 0.0
+
+
 class DatabaseSessionManager:
     def __init__(self):
         self._engine: AsyncEngine | None = None
         self._sessionmaker: async_sessionmaker | None = None
+        self._replicas: list[Replica] = []
+        self._next_replica = 0
+        self._recent_writes: dict[Any, float] = {}
+        self.replica_cooldown = 30.0
+        self.sticky_seconds = 0.0
+        self.sticky_max_entries = 10000
 
-    def init(self, host: str):
-        self._engine = create_async_engine(host)
-        self._sessionmaker = async_sessionmaker(autocommit=False, bind=self._engine)
+    def init(self, host: str, replicas: list[str] | None = None, replica_cooldown: float = 30.0,
+             sticky_seconds: float = 0.0, **engine_options):
+        self._engine = create_async_engine(host, **engine_options)
+        self._sessionmaker = async_sessionmaker(autocommit=False, expire_on_commit=False, bind=self._engine)
+        self._replicas = [Replica(create_async_engine(replica, **engine_options)) for replica in replicas or []]
+        for engine in [self._engine, *(replica.engine for replica in self._replicas)]:
+            instrument_engine(engine)
+        self.replica_cooldown = replica_cooldown
+        self.sticky_seconds = sticky_seconds
+
+    async def warmup(self, connections: int):
+        if self._engine is None:
+            raise Exception('Trying to warm up pool before initialization!')
+        await self._warmup_engine(self._engine, connections)
+        for replica in self._replicas:
+            try:
+                await self._warmup_engine(replica.engine, connections)
+            except (OSError, asyncio.TimeoutError, DBAPIError):
+                # reads fall back to the primary, the same way as when a replica fails at request time
+                replica.unhealthy_until = time.monotonic() + self.replica_cooldown
+
+    @staticmethod
+    async def _warmup_engine(engine: AsyncEngine, connections: int):
+        connections = min(connections, engine.pool.size())
+        if connections <= 0:
+            return
+        opened = await asyncio.gather(
+            *(engine.connect().start() for _ in range(connections)),
+            return_exceptions=True,
+        )
+        for connection in opened:
+            if isinstance(connection, AsyncConnection):
+                await connection.close()
+        for connection in opened:
+            if isinstance(connection, BaseException):
+                raise connection
 
     async def close(self):
         if self._engine is None:
             raise Exception('Database manager closed before initialization!')
         await self._engine.dispose()
+        for replica in self._replicas:
+            await replica.engine.dispose()
         self._engine = None
         self._sessionmaker = None
+        self._replicas = []
+
+    async def ping(self, timeout: float) -> bool:
+        if self._engine is None:
+            return False
+        try:
+            async with asyncio.timeout(timeout):
+                async with self._engine.connect() as connection:
+                    await connection.exec_driver_sql("SELECT 1")
+            return True
+        except (asyncio.TimeoutError, DBAPIError, OSError):
+            return False
+
+    def pool_status(self) -> dict:
+        if self._engine is None:
+            return {}
+        pool = self._engine.pool
+        return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": pool.overflow()}
+
+    def note_write(self, key: Any):
+        if self.sticky_seconds <= 0:
+            return
+        now = time.monotonic()
+        if len(self._recent_writes) >= self.sticky_max_entries:
+            self._recent_writes = {k: until for k, until in self._recent_writes.items() if until > now}
+        self._recent_writes[key] = now + self.sticky_seconds
+
+    def is_sticky(self, key: Any) -> bool:
+        until = self._recent_writes.get(key)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        self._recent_writes.pop(key, None)
+        return False
+
+    def _healthy_replicas(self) -> list[Replica]:
+        if not self._replicas:
+            return []
+        start = self._next_replica % len(self._replicas)
+        self._next_replica = start + 1
+        now = time.monotonic()
+        ordered = self._replicas[start:] + self._replicas[:start]
+        return [replica for replica in ordered if replica.unhealthy_until <= now]
 
     @contextlib.asynccontextmanager
     async def connect(self) -> AsyncIterator[AsyncConnection]:
@@ -40,12 +141,52 @@ class DatabaseSessionManager:
                 raise e
 
     @contextlib.asynccontextmanager
-    async def session(self) -> AsyncIterator[AsyncConnection]:
+    async def session(self) -> AsyncIterator[AsyncSession]:
         if self._sessionmaker is None:
             raise Exception('Trying to create session before initialization!')
 
         session = self._sessionmaker()
         try:
+            await self._checkout(session)
+            yield session
+        except Exception as e:
+            await session.rollback()
+            raise e
+        finally:
+            await session.close()
+
+    @staticmethod
+    async def _checkout(session: AsyncSession):
+        started = time.perf_counter()
+        await session.connection()
+        observe_checkout(time.perf_counter() - started)
+
+    async def _open_replica_session(self) -> AsyncSession | None:
+        for replica in self._healthy_replicas():
+            session = replica.sessionmaker()
+            try:
+                await self._checkout(session)
+                # lagging rows must not end up in the shared cache, see CRUD.get_cached
+                session.info["replica"] = True
+                return session
+            except (OSError, asyncio.TimeoutError, DBAPIError):
+                replica.unhealthy_until = time.monotonic() + self.replica_cooldown
+                await session.close()
+        return None
+
+    @contextlib.asynccontextmanager
+    async def read_session(self, sticky_key: Any = None) -> AsyncIterator[AsyncSession]:
+        if self._sessionmaker is None:
+            raise Exception('Trying to create session before initialization!')
+
+        session = None
+        if sticky_key is None or not self.is_sticky(sticky_key):
+            session = await self._open_replica_session()
+        if session is None:
+            session = self._sessionmaker()
+        try:
+            if not session.in_transaction():
+                await self._checkout(session)
             yield session
         except Exception as e:
             await session.rollback()
@@ -57,6 +198,29 @@ class DatabaseSessionManager:
 sessionmanager = DatabaseSessionManager()
 
 
+@event.listens_for(Session, "after_commit")
+def remember_write(session: Session):
+    sticky_key = session.info.get("sticky_key")
+    if sticky_key is not None:
+        sessionmanager.note_write(sticky_key)
+
+
 async def get_session():
     async with sessionmanager.session() as session:
         yield session
+
+
+async def get_read_session():
+    async with sessionmanager.read_session() as session:
+        yield session
+
+
+async def get_owner_session(user_id: int = Depends(get_current_user_id)):
+    async with sessionmanager.session() as session:
+        session.info["sticky_key"] = user_id
+        yield session
+
+
+async def get_owner_read_session(user_id: int = Depends(get_current_user_id)):
+    async with sessionmanager.read_session(user_id) as session:
+        yield session
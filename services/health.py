@@ -0,0 +1,7 @@
+class HealthState:
+    def __init__(self):
+        self.started = False
+        self.draining = False
+
+
+health = HealthState()
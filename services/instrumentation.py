@@ -0,0 +1,140 @@
+import contextlib
+import contextvars
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "handler", "status"),
+)
+stream_seconds = registry.histogram(
+    "http_stream_duration_seconds", "Lifetime of streaming requests by route", ("method", "handler", "status"),
+    buckets=(1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+db_statement_seconds = registry.histogram("db_statement_duration_seconds", "SQL statement execution time")
+db_checkout_seconds = registry.histogram("db_pool_checkout_seconds", "Time spent waiting for a pooled connection")
+password_hash_seconds = registry.histogram("password_hash_duration_seconds", "bcrypt hash/verify time",
+                                           buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 5.0))
+
+
+class RequestTimings:
+    __slots__ = ("queries", "durations")
+
+    def __init__(self):
+        self.queries = 0
+        self.durations: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        metrics = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.durations.items()]
+        metrics.append(f'sql;desc="{self.queries} queries"')
+        metrics.append(f'app;dur={total * 1000:.2f}')
+        return ", ".join(metrics)
+
+
+current_timings: contextvars.ContextVar[RequestTimings | None] = contextvars.ContextVar(
+    "current_timings", default=None
+)
+
+
+def record(name: str, seconds: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextlib.contextmanager
+def timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def instrument_engine(engine: AsyncEngine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_statement_seconds.observe(elapsed)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.queries += 1
+            timings.add("db", elapsed)
+
+
+def observe_checkout(seconds: float):
+    db_checkout_seconds.observe(seconds)
+    record("db-checkout", seconds)
+
+
+def observe_password_hash(seconds: float):
+    password_hash_seconds.observe(seconds)
+    record("hash", seconds)
+
+
+# handlers whose requests stay open by design, SSE, exports and uploads
+streaming_handlers: set[str] = set()
+
+
+def streaming(handler):
+    streaming_handlers.add(handler.__name__)
+    return handler
+
+
+class TimingMiddleware:
+    def __init__(self, app, slow_request_seconds: float = 1.0):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        chunked = False
+
+        async def send_with_timing(message):
+            nonlocal status, chunked
+            if message["type"] == "http.response.body" and message.get("more_body"):
+                chunked = True
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing(time.perf_counter() - started).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            if chunked or handler in streaming_handlers:
+                # would swamp the latency histogram and the slow request log
+                stream_seconds.observe(elapsed, scope["method"], handler, status)
+            else:
+                request_seconds.observe(elapsed, scope["method"], handler, status)
+            if elapsed >= self.slow_request_seconds and not chunked and handler not in streaming_handlers:
+                logger.warning("Slow request", extra={
+                    "method": scope["method"], "path": scope["path"], "handler": handler, "status": status,
+                    "duration_ms": round(elapsed * 1000, 2), "queries": timings.queries,
+                    "timings_ms": {name: round(seconds * 1000, 2) for name, seconds in timings.durations.items()},
+                })
+            current_timings.reset(token)
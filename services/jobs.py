@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from models.job import Job
+from services.database import sessionmanager
+from services.tasks import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# a handler returns True when it stopped after a chunk and wants to be called again
+Handler = Callable[[dict], Awaitable[bool | None]]
+
+
+class JobRunner:
+    def __init__(self):
+        self._handlers: dict[str, Handler] = {}
+        self._workers: list[asyncio.Task] = []
+        self._recovery: PeriodicTask | None = None
+        self._wakeup = asyncio.Event()
+        self._interrupted: list[int] = []
+        self.poll_interval = 1.0
+        self.timeout = 120.0
+        self.retry_base = 5.0
+        self.retry_max = 3600.0
+
+        self.running = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def handler(self, kind: str) -> Callable[[Handler], Handler]:
+        def register(fn: Handler) -> Handler:
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    def start(self, concurrency: int = 2, poll_interval: float = 1.0, timeout: float = 120.0,
+              stale_after: float = 300.0, retry_base: float = 5.0, retry_max: float = 3600.0):
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work(), name=f"job-worker-{n}") for n in range(concurrency)]
+        self._recovery = PeriodicTask("job-recovery", stale_after / 2, lambda: self._recover(stale_after))
+        self._recovery.start()
+
+    async def stop(self):
+        if self._recovery is not None:
+            await self._recovery.stop()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+        # handlers work in committed chunks, so an interrupted job is queued again as if it never started
+        interrupted, self._interrupted = self._interrupted, []
+        for id in interrupted:
+            try:
+                async with sessionmanager.session() as session:
+                    await Job.reschedule(session, id, count_attempt=False)
+            except Exception:
+                # recovery puts it back once it counts as stale
+                logger.exception("Error requeueing interrupted job", extra={"job_id": id})
+
+    def notify(self):
+        """Wakes up idle workers in this process instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def _recover(self, stale_after: float) -> int:
+        async with sessionmanager.session() as session:
+            return await Job.recover_stale(session, stale_after)
+
+    async def _work(self):
+        while True:
+            try:
+                async with sessionmanager.session() as session:
+                    jobs = await Job.claim(session, 1)
+            except Exception:
+                logger.exception("Error claiming jobs")
+                jobs = []
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(jobs[0])
+            except Exception:
+                # the job stays running and is picked up again by recovery
+                logger.exception("Error finishing job", extra={"job_id": jobs[0].id})
+
+    async def _run(self, job):
+        handler = self._handlers.get(job.kind)
+        self.running += 1
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            again = await asyncio.wait_for(handler(job.payload), self.timeout)
+        except asyncio.CancelledError:
+            self._interrupted.append(job.id)
+            raise
+        except Exception as e:
+            failed = job.attempts >= job.max_attempts
+            delay = min(self.retry_base * 2 ** (job.attempts - 1), self.retry_max)
+            logger.exception("Job failed", extra={"job_id": job.id, "kind": job.kind, "attempts": job.attempts,
+                                                   "final": failed})
+            async with sessionmanager.session() as session:
+                await Job.reschedule(session, job.id, delay, error=repr(e), failed=failed)
+            if failed:
+                self.failed += 1
+            else:
+                self.retried += 1
+            return
+        finally:
+            self.running -= 1
+
+        async with sessionmanager.session() as session:
+            if again:
+                await Job.reschedule(session, job.id, count_attempt=False)
+            else:
+                await Job.complete(session, job.id)
+        self.completed += 1
+
+
+job_runner = JobRunner()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+from services.instrumentation import observe_password_hash
+
+
+def _hash(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasherBusy(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail="Too many concurrent authentication requests, try again later!",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class PasswordHasher:
+    def __init__(self):
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self.rounds = 12
+        self.max_queue = 0
+        self.retry_after = 1
+
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def init(self, executor: str = "thread", workers: int = 4, max_concurrency: int | None = None,
+             max_queue: int = 64, rounds: int = 12, retry_after: int = 1):
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._semaphore = asyncio.Semaphore(max_concurrency or workers)
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.retry_after = retry_after
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._semaphore = None
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            raise Exception('Password hasher used before initialization!')
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after)
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.running -= 1
+            self._semaphore.release()
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            observe_password_hash(elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password.encode('utf-8'), self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # $2b$<rounds>$<salt and hash>, reading the cost doesn't need a worker
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.running,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+password_hasher = PasswordHasher()
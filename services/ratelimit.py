@@ -0,0 +1,182 @@
+import math
+import time
+
+import orjson
+
+from services.auth import verify_access_token
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(value: str) -> tuple[float, float]:
+    # "100/minute" -> (refill rate per second, bucket size)
+    amount, period = value.split("/")
+    return int(amount) / PERIODS[period.strip()], int(amount)
+
+
+class Rule:
+    __slots__ = ("name", "rate", "burst", "key", "methods")
+
+    def __init__(self, name: str, rate: float, burst: float, key: str, methods: frozenset[str] | None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self.methods = methods
+
+
+class MemoryBucketStore:
+    is_async = False
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        # key -> [tokens, last refill, rate, burst]
+        self._buckets: dict[str, list[float]] = {}
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_entries:
+                self._prune(now)
+            self._buckets[key] = [burst - 1, now, rate, burst]
+            return 0.0
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def _prune(self, now: float):
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        }
+
+    async def close(self):
+        self._buckets.clear()
+
+
+class RedisBucketStore:
+    is_async = True
+    SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 't', 'ts')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local last = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+    def __init__(self, url: str, prefix: str = "todos-api:ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise Exception('RATE_LIMIT_BACKEND=redis requires the "redis" package to be installed!')
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        return float(await self._script(keys=[self.prefix + key], args=[rate, burst, now]))
+
+    async def close(self):
+        await self._client.close()
+
+
+class RateLimiter:
+    def __init__(self):
+        self.enabled = False
+        self.store: MemoryBucketStore | RedisBucketStore = MemoryBucketStore()
+        self._rules: list[tuple[str, Rule]] = []
+
+    def init(self, enabled: bool = True, backend: str = "memory", url: str | None = None):
+        self.enabled = enabled
+        self.store = RedisBucketStore(url) if backend == "redis" else MemoryBucketStore()
+
+    async def close(self):
+        await self.store.close()
+
+    def limit(self, path: str, rate: str | None, key: str = "ip", methods: list[str] | None = None):
+        if not rate:
+            return
+        per_second, burst = parse_rate(rate)
+        rule = Rule(f"{path}:{key}", per_second, burst, key, frozenset(methods) if methods else None)
+        self._rules.append((path, rule))
+        # most specific path first
+        self._rules.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def match(self, path: str, method: str) -> Rule | None:
+        for prefix, rule in self._rules:
+            if path.startswith(prefix) and (rule.methods is None or method in rule.methods):
+                return rule
+        return None
+
+
+limiter = RateLimiter()
+
+
+def _access_token(scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode('latin-1').partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+        elif name == b"cookie":
+            for cookie in value.decode('latin-1').split(";"):
+                cookie_name, _, cookie_value = cookie.strip().partition("=")
+                if cookie_name == "access_token_cookie" and cookie_value:
+                    return cookie_value
+    return None
+
+
+def _subject_key(scope) -> str | None:
+    token = _access_token(scope)
+    if token is None:
+        return None
+    try:
+        return f"user:{verify_access_token(token)['id']}"
+    except Exception:
+        return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            return await self.app(scope, receive, send)
+        rule = self.limiter.match(scope["path"], scope["method"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        key = _subject_key(scope) if rule.key == "user" else None
+        if key is None:
+            client = scope.get("client")
+            key = f"ip:{client[0] if client else 'unknown'}"
+
+        store = self.limiter.store
+        retry_after = store.take(f"{rule.name}:{key}", rule.rate, rule.burst, time.time())
+        if store.is_async:
+            retry_after = await retry_after
+        if not retry_after:
+            return await self.app(scope, receive, send)
+
+        body = orjson.dumps({"detail": "Too many requests!"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,59 @@
+import base64
+import hashlib
+import hmac
+import struct
+
+from config import config
+
+ROUNDS = 4
+TAG_SIZE = 8
+
+
+class ShareCodec:
+    """Maps todo ids to opaque share tokens and back without storing anything.
+
+    The id is encrypted with a balanced Feistel network over a 64-bit block, whose round
+    function is HMAC-SHA256, and the ciphertext is followed by a truncated HMAC tag. Tokens
+    don't reveal the id or its order, and forged ones are rejected before any database access.
+    """
+
+    def __init__(self, secret: str | bytes):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        if not secret:
+            # an empty HMAC key would let anyone mint valid tokens
+            raise ValueError("Share tokens need a non-empty secret")
+        self._round_key = hmac.new(secret, b"todo-share-rounds", hashlib.sha256).digest()
+        self._tag_key = hmac.new(secret, b"todo-share-tag", hashlib.sha256).digest()
+
+    def _round(self, index: int, half: int) -> int:
+        digest = hmac.new(self._round_key, struct.pack(">BI", index, half), hashlib.sha256).digest()
+        return int.from_bytes(digest[:4], "big")
+
+    def _tag(self, block: bytes) -> bytes:
+        return hmac.new(self._tag_key, block, hashlib.sha256).digest()[:TAG_SIZE]
+
+    def encode(self, id: int) -> str:
+        left, right = id >> 32, id & 0xFFFFFFFF
+        for index in range(ROUNDS):
+            left, right = right, left ^ self._round(index, right)
+        block = struct.pack(">II", left, right)
+        return base64.urlsafe_b64encode(block + self._tag(block)).rstrip(b"=").decode('ascii')
+
+    def decode(self, token: str) -> int | None:
+        try:
+            raw = base64.urlsafe_b64decode(token.encode('ascii') + b"=" * (-len(token) % 4))
+        except (ValueError, UnicodeEncodeError):
+            return None
+        if len(raw) != 8 + TAG_SIZE:
+            return None
+        block, tag = raw[:8], raw[8:]
+        if not hmac.compare_digest(tag, self._tag(block)):
+            return None
+        left, right = struct.unpack(">II", block)
+        for index in reversed(range(ROUNDS)):
+            left, right = right ^ self._round(index, left), left
+        return (left << 32) | right
+
+
+share_codec = ShareCodec(config.SHARE_SECRET) if config.SHARE_SECRET else None
@@ -0,0 +1,35 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    def __init__(self, name: str, interval: float, callback: Callable[[], Awaitable]):
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                result = await self.callback()
+                logger.debug("Periodic task finished", extra={"task": self.name, "result": result})
+            except Exception:
+                logger.exception("Periodic task failed", extra={"task": self.name})
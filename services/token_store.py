@@ -0,0 +1,98 @@
+import time
+from datetime import datetime
+
+from models.token import RefreshTokenFamily
+from services.database import sessionmanager
+
+
+class MemoryTokenStore:
+    def __init__(self):
+        # family id -> [user id, current token id, expires at (unix time)]
+        self._families: dict[str, list] = {}
+        self._user_families: dict[int, set[str]] = {}
+
+    async def start(self, user_id: int, family_id: str, token_id: str, expires_at: datetime):
+        self._families[family_id] = [user_id, token_id, expires_at.timestamp()]
+        self._user_families.setdefault(user_id, set()).add(family_id)
+
+    async def rotate(self, family_id: str, token_id: str, new_token_id: str, expires_at: datetime) -> bool:
+        family = self._families.get(family_id)
+        if family is None:
+            return False
+        if family[1] != token_id or family[2] <= time.time():
+            await self.revoke(family_id)
+            return False
+        family[1] = new_token_id
+        family[2] = expires_at.timestamp()
+        return True
+
+    async def revoke(self, family_id: str):
+        family = self._families.pop(family_id, None)
+        if family is not None:
+            self._user_families.get(family[0], set()).discard(family_id)
+
+    async def revoke_user(self, user_id: int):
+        for family_id in self._user_families.pop(user_id, set()):
+            self._families.pop(family_id, None)
+
+    async def sweep(self) -> int:
+        now = time.time()
+        expired = [family_id for family_id, family in self._families.items() if family[2] <= now]
+        for family_id in expired:
+            await self.revoke(family_id)
+        return len(expired)
+
+
+class PostgresTokenStore:
+    async def start(self, user_id: int, family_id: str, token_id: str, expires_at: datetime):
+        async with sessionmanager.session() as session:
+            await RefreshTokenFamily.create(session, id=family_id, user_id=user_id, token_id=token_id,
+                                            expires_at=expires_at)
+
+    async def rotate(self, family_id: str, token_id: str, new_token_id: str, expires_at: datetime) -> bool:
+        async with sessionmanager.session() as session:
+            return await RefreshTokenFamily.rotate(session, family_id, token_id, new_token_id, expires_at)
+
+    async def revoke(self, family_id: str):
+        async with sessionmanager.session() as session:
+            await RefreshTokenFamily.revoke(session, RefreshTokenFamily.id == family_id)
+
+    async def revoke_user(self, user_id: int):
+        async with sessionmanager.session() as session:
+            await RefreshTokenFamily.revoke(session, RefreshTokenFamily.user_id == user_id)
+
+    async def sweep(self) -> int:
+        async with sessionmanager.session() as session:
+            return await RefreshTokenFamily.sweep(session)
+
+
+class TokenStore:
+    def __init__(self):
+        self._backend: MemoryTokenStore | PostgresTokenStore | None = None
+
+    def init(self, backend: str = "postgres"):
+        self._backend = MemoryTokenStore() if backend == "memory" else PostgresTokenStore()
+
+    @property
+    def backend(self) -> MemoryTokenStore | PostgresTokenStore:
+        if self._backend is None:
+            raise Exception('Token store used before initialization!')
+        return self._backend
+
+    async def start(self, user_id: int, family_id: str, token_id: str, expires_at: datetime):
+        await self.backend.start(user_id, family_id, token_id, expires_at)
+
+    async def rotate(self, family_id: str, token_id: str, new_token_id: str, expires_at: datetime) -> bool:
+        return await self.backend.rotate(family_id, token_id, new_token_id, expires_at)
+
+    async def revoke(self, family_id: str):
+        await self.backend.revoke(family_id)
+
+    async def revoke_user(self, user_id: int):
+        await self.backend.revoke_user(user_id)
+
+    async def sweep(self) -> int:
+        return await self.backend.sweep()
+
+
+token_store = TokenStore()
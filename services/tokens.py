@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from config import jwt_config
+from services.token_store import token_store
+
+
+def create_tokens(user_id: int, family_id: str, token_id: str) -> dict:
+    access_token = jwt_config.access_security.create_access_token(subject={"id": user_id})
+    refresh_token = jwt_config.refresh_security.create_refresh_token(
+        subject={"id": user_id, "fid": family_id, "tid": token_id}
+    )
+    return {"access_token": access_token, "refresh_token": refresh_token}
+
+
+def refresh_expires_at() -> datetime:
+    return datetime.now(timezone.utc) + jwt_config.refresh_expires_delta
+
+
+async def issue_tokens(user_id: int) -> dict:
+    """Starts a new refresh token family for an already authenticated user."""
+    family_id, token_id = uuid4().hex, uuid4().hex
+    await token_store.start(user_id, family_id, token_id, refresh_expires_at())
+    return create_tokens(user_id, family_id, token_id)
+
+
+async def rotate_tokens(user_id: int, family_id: str, token_id: str) -> dict | None:
+    new_token_id = uuid4().hex
+    if not await token_store.rotate(family_id, token_id, new_token_id, refresh_expires_at()):
+        return None
+    return create_tokens(user_id, family_id, new_token_id)
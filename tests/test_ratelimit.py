@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from services.ratelimit import RateLimiter, RateLimitMiddleware
+
+PROXY = "10.0.0.1"
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def login_app():
+    limiter = RateLimiter()
+    limiter.init(enabled=True)
+    limiter.limit("/auth/login", "1/minute", key="ip", methods=["POST"])
+    return ProxyHeadersMiddleware(RateLimitMiddleware(ok_app, limiter), trusted_hosts=PROXY)
+
+
+def post_login(app, forwarded_for: str, peer: str = PROXY) -> int:
+    scope = {
+        "type": "http", "method": "POST", "path": "/auth/login", "scheme": "http",
+        "client": (peer, 40000), "headers": [(b"x-forwarded-for", forwarded_for.encode())],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"]
+
+
+def test_forwarded_clients_get_their_own_bucket():
+    app = login_app()
+    assert post_login(app, "203.0.113.1") == 200
+    assert post_login(app, "203.0.113.2") == 200
+    assert post_login(app, "203.0.113.1") == 429
+
+
+def test_untrusted_peer_cannot_pick_its_bucket():
+    app = login_app()
+    assert post_login(app, "203.0.113.1", peer="198.51.100.7") == 200
+    assert post_login(app, "203.0.113.2", peer="198.51.100.7") == 429
@@ -1,7 +1,27 @@
+import base64
+import json
+
+
 def without_keys(d: dict, keys: list[str]) -> dict:
     return {x: d[x] for x in d if x not in keys}
 
 
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list):
+        raise ValueError("Malformed cursor")
+    return values
+
+
 class JWTPayloadError(Exception):
     def __init__(self, detail: str):
         self.detail = detail
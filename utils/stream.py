@@ -0,0 +1,55 @@
+import csv
+import io
+from typing import AsyncIterator, Iterable
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line: int) -> AsyncIterator[bytes]:
+    """Splits a byte stream into lines, holding at most one partial line in memory."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield buffer[start:end + 1]
+            start = end + 1
+        buffer = buffer[start:]
+        if len(buffer) > max_line:
+            raise LineTooLong(f"Line longer than {max_line} bytes")
+    if buffer:
+        yield buffer
+
+
+async def iter_csv_records(lines: AsyncIterator[bytes], max_record: int) -> AsyncIterator[dict]:
+    """Parses CSV with a header row; quoted fields may span lines."""
+    header, pending, size = None, [], 0
+    async for line in lines:
+        text = line.decode('utf-8')
+        if header is None:
+            text = text.removeprefix("\ufeff")
+        pending.append(text)
+        size += len(line)
+        # an odd number of quotes so far means a quoted field continues on the next line
+        if sum(part.count('"') for part in pending) % 2:
+            if size > max_record:
+                raise LineTooLong(f"Record longer than {max_record} bytes")
+            continue
+        fields = next(csv.reader(pending), [])
+        pending, size = [], 0
+        if not fields:
+            continue
+        if header is None:
+            header = [field.strip() for field in fields]
+            continue
+        yield dict(zip(header, fields))
+    if pending:
+        raise ValueError("Unterminated quoted field at the end of the upload")
+
+
+def csv_line(values: Iterable) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue().encode('utf-8')
@@ -1,31 +1,74 @@
-from fastapi import APIRouter, HTTPException, Depends, Security
+import logging
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Response, Security
 from fastapi_jwt import JwtAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import jwt_config
-from services.database import get_session
+from config import config, jwt_config
+from services.auth import get_current_user_id
+from services.database import get_session, sessionmanager
+from services.passwords import password_hasher, PasswordHasherBusy
+from services.ratelimit import limiter
+from services.token_store import token_store
+from services.tokens import issue_tokens, rotate_tokens
 from views.schemas.auth import TokensSchema
 from views.schemas.user import UserSchemaSignin
 from models.user import User as UserModel
 
 router = APIRouter(prefix='/auth', tags=['Auth'])
+limiter.limit('/auth/login', config.RATE_LIMIT_LOGIN, key="ip", methods=["POST"])
+limiter.limit(router.prefix, config.RATE_LIMIT_AUTH, key="ip")
+logger = logging.getLogger(__name__)
+
+
+async def rehash_password(user_id: int, password: str, old_hash: str):
+    try:
+        new_hash = await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        # retried on the next login
+        return
+    try:
+        async with sessionmanager.session() as session:
+            await UserModel.replace_password_hash(session, user_id, old_hash, new_hash)
+    except Exception:
+        logger.exception("Error rehashing password", extra={"user_id": user_id})
 
 
 @router.post('/login', response_model=TokensSchema)
-async def login(user: UserSchemaSignin, session: AsyncSession = Depends(get_session)):
+async def login(user: UserSchemaSignin, background_tasks: BackgroundTasks,
+                session: AsyncSession = Depends(get_session)):
     user_data = await UserModel.login(session, user.username, user.password)
 
     if user_data is None:
         raise HTTPException(status_code=401, detail="Invalid username or password!")
 
-    access_token = jwt_config.access_security.create_access_token(subject={"id": user_data.id})
-    refresh_token = jwt_config.refresh_security.create_refresh_token(subject={"id": user_data.id})
-    return {"access_token": access_token, "refresh_token": refresh_token}
+    if password_hasher.needs_rehash(user_data.password):
+        # moves the stored hash to the configured BCRYPT_ROUNDS after the response is sent
+        background_tasks.add_task(rehash_password, user_data.id, user.password, user_data.password)
+    return await issue_tokens(user_data.id)
 
 
 @router.post('/refresh-tokens', response_model=TokensSchema)
 async def refresh_tokens(credentials: JwtAuthorizationCredentials = Security(jwt_config.refresh_security)):
-    access_token = jwt_config.access_security.create_access_token(subject=credentials.subject)
-    refresh_token = jwt_config.refresh_security.create_refresh_token(subject=credentials.subject)
+    family_id, token_id = credentials.subject.get("fid"), credentials.subject.get("tid")
+    if family_id is None or token_id is None:
+        raise HTTPException(status_code=401, detail="Refresh token is outdated, log in again!")
+
+    tokens = await rotate_tokens(credentials.subject["id"], family_id, token_id)
+    if tokens is None:
+        raise HTTPException(status_code=401, detail="Refresh token was revoked or already used!")
+    return tokens
+
+
+@router.post('/logout')
+async def logout(credentials: JwtAuthorizationCredentials = Security(jwt_config.refresh_security)):
+    family_id = credentials.subject.get("fid")
+    if family_id is not None:
+        await token_store.revoke(family_id)
+    return Response(status_code=200, content="Successfully logged out")
+
 
-    return {"access_token": access_token, "refresh_token": refresh_token}
+@router.post('/logout-everywhere')
+async def logout_everywhere(user_id: int = Depends(get_current_user_id)):
+    await token_store.revoke_user(user_id)
+    return Response(status_code=200, content="Successfully logged out from all devices")
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+
+from config import config
+from services.database import sessionmanager
+from services.health import health
+
+router = APIRouter(prefix='/health', tags=['Health'])
+
+
+@router.get('/live', include_in_schema=False)
+async def live():
+    # only proves the event loop is responsive, a database outage must not restart workers
+    return {"status": "ok"}
+
+
+@router.get('/ready', include_in_schema=False)
+async def ready():
+    pool = sessionmanager.pool_status()
+    if health.draining:
+        return ORJSONResponse({"status": "draining", "pool": pool}, status_code=503)
+    if not health.started or not await sessionmanager.ping(config.HEALTH_CHECK_TIMEOUT):
+        return ORJSONResponse({"status": "unavailable", "pool": pool}, status_code=503)
+    return {"status": "ok", "pool": pool}
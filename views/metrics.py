@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.auth import token_cache
+from services.broker import broker
+from services.cache import cache
+from services.database import sessionmanager
+from services.jobs import job_runner
+from services.metrics import registry
+from services.passwords import password_hasher
+
+router = APIRouter(tags=['Metrics'])
+
+
+def pool_checked_out() -> float:
+    engine = sessionmanager._engine
+    return engine.pool.checkedout() if engine is not None else 0
+
+
+registry.gauge("password_hash_queue_depth", "Password hashes waiting for a worker",
+               lambda: password_hasher.waiting)
+registry.gauge("password_hash_in_flight", "Password hashes running", lambda: password_hasher.running)
+registry.callback_counter("password_hash_rejected_total", "Password hashes rejected with 429",
+                          lambda: password_hasher.rejected)
+registry.callback_counter("cache_hits_total", "Cache hits", lambda: cache.hits)
+registry.callback_counter("cache_misses_total", "Cache misses", lambda: cache.misses)
+registry.callback_counter("access_token_cache_hits_total", "Access tokens served from the verification cache",
+                          lambda: token_cache.hits)
+registry.callback_counter("access_token_cache_misses_total", "Access tokens verified from scratch",
+                          lambda: token_cache.misses)
+registry.gauge("todo_event_subscribers", "Open todo event streams", lambda: broker.subscriber_count)
+registry.callback_counter("todo_event_dropped_total", "Event streams closed for falling behind",
+                          lambda: broker.dropped)
+registry.gauge("jobs_running", "Background jobs running", lambda: job_runner.running)
+registry.callback_counter("jobs_completed_total", "Background jobs completed",
+                          lambda: job_runner.completed)
+registry.callback_counter("jobs_retried_total", "Background job attempts that failed and were retried",
+                          lambda: job_runner.retried)
+registry.callback_counter("jobs_failed_total", "Background jobs that ran out of attempts",
+                          lambda: job_runner.failed)
+registry.gauge("db_pool_checked_out", "Primary pool connections in use", pool_checked_out)
+
+
+@router.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
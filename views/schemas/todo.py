@@ -1,5 +1,11 @@
-from datetime import datetime
-from pydantic import BaseModel
+import re
+from datetime import date, datetime
+from enum import Enum
+
+from pydantic import BaseModel, Field, field_validator
+
+from config import config
+from models.change import TodoChangeOperation
 from models.todo import TodoState
 from views.schemas.user import UserSchema
 
@@ -12,12 +18,24 @@ class TodoSchema(BaseModel):
     created_at: datetime
 
 
+# search highlighting uses control characters as markers, tabs and line breaks stay allowed
+CONTROL_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+
+
+def check_description(value: str | None) -> str | None:
+    if value is not None and CONTROL_CHARACTERS.search(value):
+        raise ValueError("description can't contain control characters")
+    return value
+
+
 class TodoSchemaCreate(TodoSchema):
     id: None = None
     state: None = None
     owner_id: None = None
     created_at: None = None
 
+    validate_description = field_validator('description')(check_description)
+
 
 class TodoSchemaUpdate(TodoSchema):
     id: None = None
@@ -26,7 +44,78 @@ class TodoSchemaUpdate(TodoSchema):
     description: str | None = None
     state: TodoState | None = None
 
+    validate_description = field_validator('description')(check_description)
+
+
+class TodoSearchResultSchema(TodoSchema):
+    rank: float
+    highlight: str
+
 
 class TodoWithOwnerSchema(TodoSchema):
     owner: UserSchema
 
+
+class TodoExportFormat(str, Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+
+class TodoSchemaImport(BaseModel):
+    description: str = Field(max_length=config.TODOS_IMPORT_DESCRIPTION_MAX_LENGTH)
+    state: TodoState = TodoState.passive
+    created_at: date | None = None
+
+    validate_description = field_validator('description')(check_description)
+
+
+class TodoImportProgressSchema(BaseModel):
+    import_id: str
+    status: str
+    imported: int
+    rejected: int
+    errors: list[str]
+
+
+class TodoShareSchema(BaseModel):
+    token: str
+    path: str
+
+
+class TodoSchemaBatchUpdate(TodoSchemaUpdate):
+    id: int
+
+
+class TodoSchemaBatchDelete(BaseModel):
+    ids: list[int]
+
+
+class TodoBatchResultSchema(BaseModel):
+    id: int
+    success: bool
+    todo: TodoSchema | None = None
+
+
+class TodoDayCountSchema(BaseModel):
+    day: date
+    count: int
+
+
+class TodoStatsSchema(BaseModel):
+    total: int
+    states: dict[TodoState, int]
+    days: list[TodoDayCountSchema]
+
+
+class TodoChangeSchema(BaseModel):
+    seq: int
+    todo_id: int
+    operation: TodoChangeOperation
+    todo: TodoSchema | None = None
+
+
+class TodoChangesSchema(BaseModel):
+    changes: list[TodoChangeSchema]
+    cursor: int
+    has_more: bool
+    reset: bool = False
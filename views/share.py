@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from services.database import get_read_session
+from services.ratelimit import limiter
+from services.share import share_codec
+from utils.http import make_etag, not_modified, validator_headers
+from views.schemas.todo import TodoWithOwnerSchema
+from models.todo import Todo as TodoModel
+from models.user import User as UserModel
+
+router = APIRouter(prefix='/share', tags=['Share'])
+limiter.limit(router.prefix, config.RATE_LIMIT_SHARE, key="ip")
+
+# shared caches and CDNs may keep public todos a bit longer than browsers do
+CACHE_CONTROL = f"public, max-age={config.SHARE_MAX_AGE}, s-maxage={config.SHARE_SHARED_MAX_AGE}, " \
+                f"stale-while-revalidate={config.SHARE_MAX_AGE}"
+
+
+@router.get('/{token}', response_model=TodoWithOwnerSchema)
+async def get_shared_todo(
+        token: str,
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_read_session)):
+    id = share_codec.decode(token) if share_codec is not None else None
+    todo = await TodoModel.get_cached(session, id) if id is not None else None
+    owner = await UserModel.get_cached(session, todo["owner_id"]) if todo is not None else None
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Shared todo not found!",
+                            headers={"Cache-Control": CACHE_CONTROL})
+
+    etag = make_etag("share", todo["id"], todo["version"], owner["version"])
+    last_modified = max(todo["updated_at"], owner["updated_at"])
+    cached = not_modified(request, etag, last_modified, CACHE_CONTROL)
+    if cached is not None:
+        return cached
+    response.headers.update(validator_headers(etag, last_modified, CACHE_CONTROL))
+    return {**todo, "owner": owner}
@@ -1,109 +1,529 @@
-from typing import List
+import asyncio
+import hashlib
+import html
+import logging
+from datetime import date, datetime
+from enum import Enum
+from typing import AsyncIterator, List
+from uuid import uuid4
 
-from fastapi import HTTPException, Depends, APIRouter, Response, Security
-from fastapi_jwt import JwtAuthorizationCredentials
+from fastapi import HTTPException, Depends, APIRouter, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import jwt_config
-from services.database import get_session
-from views.schemas.todo import TodoSchemaCreate, TodoSchema, TodoSchemaUpdate, TodoWithOwnerSchema
-from models.todo import Todo as TodoModel
+from config import config
+from services.auth import get_current_user_id
+from services.broker import broker, Subscription
+from services.cache import cache
+from services.share import share_codec
+from services.ratelimit import limiter
+from services.instrumentation import timed, streaming
+from services.database import get_owner_session, get_owner_read_session, sessionmanager
+from utils import encode_cursor, decode_cursor
+from utils.http import make_etag, not_modified, validator_headers
+from utils.stream import iter_lines, iter_csv_records, csv_line
+from views.schemas.todo import TodoSchemaCreate, TodoSchema, TodoSchemaUpdate, TodoWithOwnerSchema, \
+    TodoSchemaBatchUpdate, TodoSchemaBatchDelete, TodoBatchResultSchema, TodoChangesSchema, TodoSearchResultSchema, \
+    TodoStatsSchema, TodoShareSchema, TodoExportFormat, TodoSchemaImport, TodoImportProgressSchema
+from models.change import TodoChange as TodoChangeModel, TodoChangeOperation
+from models.todo import Todo as TodoModel, TodoState, HIGHLIGHT_START, HIGHLIGHT_STOP
 from models.user import User as UserModel
 
 router = APIRouter(prefix='/todos', tags=['Todo'])
+limiter.limit(router.prefix, config.RATE_LIMIT_TODOS, key="user")
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = ("id", "owner_id", "description", "state", "created_at")
+IMPORT_MAX_ERRORS = 20
+
+
+def parse_todo_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        created_at, id = decode_cursor(cursor)
+        return date.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor!")
+
+
+def parse_search_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, id = decode_cursor(cursor)
+        return float(rank), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor!")
+
+
+def render_highlight(headline: str) -> str:
+    return html.escape(headline).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+async def stream_todos(owner_id: int, **filters):
+    async with sessionmanager.read_session(owner_id) as session:
+        async for row in TodoModel.stream_by_owner(session, owner_id,
+                                                   batch_size=config.TODOS_STREAM_BATCH_SIZE, **filters):
+            yield orjson.dumps(dict(row), option=orjson.OPT_APPEND_NEWLINE)
+
+
+def csv_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+async def stream_todos_csv(owner_id: int, **filters):
+    yield csv_line(CSV_COLUMNS)
+    async with sessionmanager.read_session(owner_id) as session:
+        async for row in TodoModel.stream_by_owner(session, owner_id,
+                                                   batch_size=config.TODOS_STREAM_BATCH_SIZE, **filters):
+            yield csv_line(csv_value(row[column]) for column in CSV_COLUMNS)
+
+
+async def upload_records(request: Request, format: TodoExportFormat) -> AsyncIterator[bytes | dict]:
+    lines = iter_lines(request.stream(), config.TODOS_IMPORT_MAX_LINE_BYTES)
+    if format == TodoExportFormat.csv:
+        async for record in iter_csv_records(lines, config.TODOS_IMPORT_MAX_LINE_BYTES):
+            # empty cells fall back to the defaults
+            yield {key: value for key, value in record.items() if value != ""}
+    else:
+        async for line in lines:
+            if line.strip():
+                yield line
+
+
+def import_progress_key(owner_id: int, import_id: str) -> str:
+    return f"todo-import:{owner_id}:{import_id}"
+
+
+def rejection(number: int, error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        first = error.errors(include_url=False)[0]
+        return f"Record {number}: {'.'.join(map(str, first['loc']))} {first['msg']}"
+    return f"Record {number}: {error}"
 
 
 @router.get('/my', response_model=List[TodoSchema])
 async def get_todos_by_owner(
-        credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security),
-        session: AsyncSession = Depends(get_session)):
-    todo_list = await TodoModel.get_by_owner(session, credentials.subject["id"])
-    if todo_list is None:
-        raise HTTPException(status_code=404, detail="Todos for this owner.id not found!")
-    return todo_list
+        request: Request,
+        state: TodoState | None = None,
+        created_from: date | None = None,
+        created_to: date | None = None,
+        cursor: str | None = None,
+        limit: int = Query(config.TODOS_PAGE_SIZE, ge=1, le=config.TODOS_PAGE_SIZE_MAX),
+        stream: bool = False,
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    headers = {}
+    marker = await UserModel.get_todos_version(session, owner_id)
+    if marker is not None:
+        query_digest = hashlib.blake2b(request.url.query.encode('utf-8'), digest_size=6).hexdigest()
+        etag = make_etag("todos", owner_id, marker.todos_version, query_digest)
+        cached = not_modified(request, etag, marker.todos_updated_at)
+        if cached is not None:
+            return cached
+        headers = validator_headers(etag, marker.todos_updated_at)
+
+    filters = {"state": state, "created_from": created_from, "created_to": created_to}
+    if stream:
+        # the dependency session is only closed after the response, stream_todos reads on its own connection
+        await session.close()
+        return StreamingResponse(stream_todos(owner_id, **filters),
+                                 media_type="application/x-ndjson", headers=headers)
+
+    after = parse_todo_cursor(cursor) if cursor is not None else None
+    rows, next_key = await TodoModel.get_page_by_owner(
+        session, owner_id, limit, after=after, **filters
+    )
+    if next_key is not None:
+        headers["X-Next-Cursor"] = encode_cursor(*next_key)
+    # rows already match TodoSchema, so they skip response_model validation
+    with timed("serialize"):
+        return ORJSONResponse([dict(row) for row in rows], headers=headers)
+
+
+@router.get('/search', response_model=List[TodoSearchResultSchema])
+async def search_todos(
+        q: str = Query(..., min_length=1, max_length=256),
+        cursor: str | None = None,
+        limit: int = Query(config.TODOS_PAGE_SIZE, ge=1, le=config.TODOS_PAGE_SIZE_MAX),
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    after = parse_search_cursor(cursor) if cursor is not None else None
+    rows, next_key = await TodoModel.search_by_owner(session, owner_id, q, limit, after=after)
+    headers = {}
+    if next_key is not None:
+        headers["X-Next-Cursor"] = encode_cursor(*next_key)
+    with timed("serialize"):
+        return ORJSONResponse(
+            [{**row, "highlight": render_highlight(row["highlight"])} for row in rows], headers=headers
+        )
+
+
+@router.get('/export')
+@streaming
+async def export_todos(
+        format: TodoExportFormat = TodoExportFormat.ndjson,
+        state: TodoState | None = None,
+        created_from: date | None = None,
+        created_to: date | None = None,
+        owner_id: int = Depends(get_current_user_id)):
+    filters = {"state": state, "created_from": created_from, "created_to": created_to}
+    headers = {"Content-Disposition": f'attachment; filename="todos.{format.value}"'}
+    if format == TodoExportFormat.csv:
+        return StreamingResponse(stream_todos_csv(owner_id, **filters), media_type="text/csv", headers=headers)
+    return StreamingResponse(stream_todos(owner_id, **filters), media_type="application/x-ndjson", headers=headers)
+
+
+@router.post('/import', response_model=TodoImportProgressSchema)
+@streaming
+async def import_todos(
+        request: Request,
+        format: TodoExportFormat | None = None,
+        import_id: str | None = Query(None, min_length=1, max_length=64),
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
+    if format is None:
+        format = TodoExportFormat.csv if "csv" in request.headers.get("content-type", "") \
+            else TodoExportFormat.ndjson
+    # clients pick the id up front to watch /todos/import/{import_id} while uploading
+    import_id = import_id or uuid4().hex
+    # the write path refuses deleted owners as well, this only saves reading the upload first
+    owner = await UserModel.get_cached(session, owner_id)
+    # hands the connection back while the upload is read, the first chunk checks one out again
+    await session.rollback()
+    if owner is None:
+        raise HTTPException(status_code=404, detail="User not found!")
+    key = import_progress_key(owner_id, import_id)
+    progress = {"import_id": import_id, "status": "running", "imported": 0, "rejected": 0, "errors": []}
+    await cache.set(key, progress, config.TODOS_IMPORT_PROGRESS_TTL)
+
+    chunk, chunk_bytes, number = [], 0, 0
+    try:
+        async for record in upload_records(request, format):
+            number += 1
+            try:
+                data = orjson.loads(record) if isinstance(record, bytes) else record
+                row = TodoSchemaImport.model_validate(data).model_dump()
+                chunk.append(row)
+                chunk_bytes += len(row["description"].encode())
+            except ValueError as e:
+                progress["rejected"] += 1
+                if len(progress["errors"]) < IMPORT_MAX_ERRORS:
+                    progress["errors"].append(rejection(number, e))
+            if len(chunk) >= config.TODOS_IMPORT_CHUNK_SIZE or chunk_bytes >= config.TODOS_IMPORT_CHUNK_BYTES:
+                progress["imported"] += await TodoModel.import_chunk_for(owner_id, session, chunk)
+                chunk, chunk_bytes = [], 0
+                await cache.set(key, progress, config.TODOS_IMPORT_PROGRESS_TTL)
+        progress["imported"] += await TodoModel.import_chunk_for(owner_id, session, chunk)
+    except HTTPException as e:
+        progress["status"] = "failed"
+        await cache.set(key, progress, config.TODOS_IMPORT_PROGRESS_TTL)
+        raise e
+    except ValueError as e:
+        # the upload itself is malformed, chunks before this point stay imported
+        progress["status"] = "failed"
+        progress["errors"].append(str(e))
+        await cache.set(key, progress, config.TODOS_IMPORT_PROGRESS_TTL)
+        raise HTTPException(status_code=400, detail=progress)
+    except Exception as e:
+        logger.exception("Error importing todos", extra={"owner_id": owner_id, "import_id": import_id})
+        progress["status"] = "failed"
+        await cache.set(key, progress, config.TODOS_IMPORT_PROGRESS_TTL)
+        raise HTTPException(status_code=500, detail="Error importing todos!")
+    finally:
+        if progress["imported"]:
+            await broker.publish(owner_id, [{"operation": "reset", "todo_id": None, "todo": None}])
+
+    progress["status"] = "done"
+    await cache.set(key, progress, config.TODOS_IMPORT_PROGRESS_TTL)
+    return progress
+
+
+@router.get('/import/{import_id}', response_model=TodoImportProgressSchema)
+async def get_import_progress(import_id: str, owner_id: int = Depends(get_current_user_id)):
+    progress = await cache.get(import_progress_key(owner_id, import_id))
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Import not found!")
+    return progress
+
+
+@router.get('/stats', response_model=TodoStatsSchema)
+async def get_todo_stats(
+        request: Request,
+        response: Response,
+        created_from: date | None = None,
+        created_to: date | None = None,
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    marker = await UserModel.get_todos_version(session, owner_id)
+    if marker is None:
+        raise HTTPException(status_code=404, detail="User not found!")
+    etag = make_etag("todo-stats", owner_id, marker.todos_version, created_from, created_to)
+    cached = not_modified(request, etag, marker.todos_updated_at)
+    if cached is not None:
+        return cached
+    response.headers.update(validator_headers(etag, marker.todos_updated_at))
+
+    key = f"todo-stats:{owner_id}:{marker.todos_version}:{created_from}:{created_to}"
+    stats = await cache.get(key)
+    if stats is None:
+        stats = await TodoModel.get_stats(session, owner_id, created_from=created_from, created_to=created_to)
+        await cache.set(key, stats, config.TODOS_STATS_CACHE_TTL)
+    return stats
+
+
+def todo_event(operation: str, todo) -> dict:
+    todo = TodoSchema.model_validate(todo, from_attributes=True)
+    return {"operation": operation, "todo_id": todo.id, "todo": todo.model_dump(mode="json")}
+
+
+async def publish_todos(owner_id: int, operation: str, todos):
+    await broker.publish(owner_id, [todo_event(operation, todo) for todo in todos])
+
+
+async def publish_deleted(owner_id: int, ids):
+    await broker.publish(owner_id, [{"operation": "delete", "todo_id": id, "todo": None} for id in ids])
+
+
+async def event_stream(subscription: Subscription):
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(subscription.queue.get(), config.SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing idle streams and detects gone clients
+                yield b": keepalive\n\n"
+                continue
+            if payload is None:
+                break
+            yield b"data: " + payload + b"\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@router.get('/events')
+@streaming
+async def get_todo_events(owner_id: int = Depends(get_current_user_id)):
+    subscription = broker.subscribe(owner_id)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many event streams, try again later!",
+                            headers={"Retry-After": "5"})
+    return StreamingResponse(event_stream(subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get('/changes', response_model=TodoChangesSchema)
+async def get_todo_changes(
+        since: int = Query(0, ge=0),
+        limit: int = Query(config.TODOS_PAGE_SIZE, ge=1, le=config.TODOS_PAGE_SIZE_MAX),
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    compacted_seq = await UserModel.get_changes_compacted_seq(session, owner_id)
+    if compacted_seq is None:
+        raise HTTPException(status_code=404, detail="User not found!")
+    if since < compacted_seq:
+        # deletions after `since` were compacted away, the client has to refetch /todos/my
+        # an import can raise changes_compacted_seq above the last recorded change
+        cursor = max(await TodoChangeModel.last_seq(session, owner_id), compacted_seq)
+        return {"changes": [], "cursor": cursor, "has_more": False, "reset": True}
+
+    changes = await TodoChangeModel.get_since(session, owner_id, since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {change.todo_id: change for change in changes}
+    upserted = [change.todo_id for change in latest.values() if change.operation == TodoChangeOperation.upsert]
+    todos = {row["id"]: dict(row) for row in await TodoModel.get_rows_for(owner_id, session, upserted)} \
+        if upserted else {}
+    result = []
+    for change in sorted(latest.values(), key=lambda change: change.id):
+        todo = todos.get(change.todo_id)
+        result.append({
+            "seq": change.id,
+            "todo_id": change.todo_id,
+            "operation": TodoChangeOperation.upsert if todo is not None else TodoChangeOperation.delete,
+            "todo": todo,
+        })
+    return {"changes": result, "cursor": changes[-1].id if changes else since, "has_more": has_more}
 
 
 @router.post('/create', response_model=TodoSchema)
 async def create_todo(
         todo_data: TodoSchemaCreate,
-        credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security),
-        session: AsyncSession = Depends(get_session)):
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
     try:
         payload = todo_data.model_dump(exclude_none=True)
-        todo = await TodoModel.create_for(credentials.subject["id"], session, **payload)
+        todo = await TodoModel.create_for(owner_id, session, **payload)
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        print(str(e))
+        logger.exception("Error creating todo", extra={"owner_id": owner_id})
         raise HTTPException(status_code=500, detail="Error creating todo!")
     if 'id' not in todo.__dict__:
-        print(todo.__dict__)
+        logger.error("Created todo has no id", extra={"owner_id": owner_id})
         raise HTTPException(status_code=400, detail="Error creating todo!")
+    await publish_todos(owner_id, "create", [todo])
     return todo
 
 
+def check_batch_size(items: list):
+    if len(items) > config.TODOS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Batch can't contain more than {config.TODOS_BATCH_MAX} items!")
+
+
+@router.post('/batch/create', response_model=List[TodoSchema])
+async def create_todos(
+        todos_data: List[TodoSchemaCreate],
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
+    check_batch_size(todos_data)
+    try:
+        rows = [todo_data.model_dump(exclude_none=True) for todo_data in todos_data]
+        todos = await TodoModel.create_many_for(owner_id, session, rows)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception("Error creating todos", extra={"owner_id": owner_id, "count": len(todos_data)})
+        raise HTTPException(status_code=500, detail="Error creating todos!")
+    await publish_todos(owner_id, "create", todos)
+    return todos
+
+
+@router.put('/batch/update', response_model=List[TodoBatchResultSchema])
+async def update_todos(
+        data_to_update: List[TodoSchemaBatchUpdate],
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
+    check_batch_size(data_to_update)
+    try:
+        items = [item.model_dump(exclude_none=True) for item in data_to_update]
+        updated = {todo.id: todo for todo in await TodoModel.update_many_for(owner_id, session, items)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception("Error updating todos", extra={"owner_id": owner_id, "count": len(data_to_update)})
+        raise HTTPException(status_code=500, detail=str(e))
+    # items without any field to change were only read back
+    changed = {item.id for item in data_to_update if item.model_dump(exclude_none=True).keys() - {"id"}}
+    await publish_todos(owner_id, "update", [todo for id, todo in updated.items() if id in changed])
+    return [
+        TodoBatchResultSchema(id=item.id, success=item.id in updated,
+                              todo=TodoSchema.model_validate(updated[item.id], from_attributes=True)
+                              if item.id in updated else None)
+        for item in data_to_update
+    ]
+
+
+@router.delete('/batch/delete', response_model=List[TodoBatchResultSchema])
+async def delete_todos(
+        data_to_delete: TodoSchemaBatchDelete,
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
+    check_batch_size(data_to_delete.ids)
+    try:
+        deleted = await TodoModel.delete_many_for(owner_id, session, data_to_delete.ids)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception("Error deleting todos", extra={"owner_id": owner_id, "count": len(data_to_delete.ids)})
+        raise HTTPException(status_code=500, detail=str(e))
+    await publish_deleted(owner_id, deleted)
+    return [TodoBatchResultSchema(id=id, success=id in deleted) for id in data_to_delete.ids]
+
+
 @router.put('/{id}/update', response_model=TodoSchema)
 async def update_todo(
         id: int,
         data_to_update: TodoSchemaUpdate,
-        credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security),
-        session: AsyncSession = Depends(get_session)):
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
     try:
         payload = data_to_update.model_dump(exclude_none=True)
-        todo = await TodoModel.get(session, id=id)
-        if todo is None:
-            raise HTTPException(status_code=404, detail="Todo not found!")
-        if todo.owner_id != credentials.subject["id"]:
-            raise HTTPException(status_code=400, detail="Todo you want to update can't be accessed by you!")
-        todo = await todo.update_inst(session, **payload)
-        return todo
+        todo = await TodoModel.update_for(owner_id, session, id, **payload)
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(str(e))
+        logger.exception("Error updating todo", extra={"owner_id": owner_id, "todo_id": id})
         raise HTTPException(status_code=500, detail=str(e))
+    if todo is None:
+        raise HTTPException(status_code=404, detail="Todo not found!")
+    if payload:
+        await publish_todos(owner_id, "update", [todo])
+    return todo
 
 
 @router.delete('/{id}/delete')
 async def delete_todo(
         id: int,
-        credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security),
-        session: AsyncSession = Depends(get_session)):
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)):
     try:
-        todo = await TodoModel.get(session, id)
-        if todo is None:
-            raise HTTPException(status_code=404, detail="Todo not found!")
-        if todo.owner_id != credentials.subject["id"]:
-            raise HTTPException(status_code=400, detail="Todo you want to update can't be accessed by you!")
-        is_deleted = await todo.delete_inst(session)
+        is_deleted = await TodoModel.delete_for(owner_id, session, id)
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(str(e))
+        logger.exception("Error deleting todo", extra={"owner_id": owner_id, "todo_id": id})
         raise HTTPException(status_code=500, detail=str(e))
     if is_deleted:
+        await publish_deleted(owner_id, [id])
         return Response(status_code=200, content="Successfully deleted todo")
     else:
         raise HTTPException(status_code=404, detail="Todo not found!")
 
 
-# add functionality of encryption todo.id to make any todo accessible only with encrypted id
+@router.get('/{id}/share', response_model=TodoShareSchema)
+async def share_todo(
+        id: int,
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    todo = await TodoModel.get_cached(session, id)
+    if todo is None or todo["owner_id"] != owner_id:
+        raise HTTPException(status_code=404, detail="Todo not found!")
+    if share_codec is None:
+        raise HTTPException(status_code=503, detail="Share links are not configured!")
+    token = share_codec.encode(id)
+    return {"token": token, "path": f"/share/{token}"}
+
+
+# id-based reads are owner-only, anyone else goes through /share/{token}
 @router.get('/{id}/with-owner', response_model=TodoWithOwnerSchema)
 async def get_todo_with_owner_data(
         id: int,
-        session: AsyncSession = Depends(get_session)):
-    todo = await get_todo(id, session)
-    owner = await UserModel.get(session, todo.owner_id)
-    if owner is None:
-        raise HTTPException(status_code=404, detail="Owner for this todo.id not found!")
-    return TodoWithOwnerSchema(**todo.__dict__, owner=owner)
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    todo = await TodoModel.get_with_owner(session, id, TodoModel.owner_id == owner_id)
+    if todo is None:
+        raise HTTPException(status_code=404, detail="Todo with this id not found!")
+    return todo
+
+
+@router.get('/with-owner', response_model=List[TodoWithOwnerSchema])
+async def get_todos_with_owner_data(
+        ids: List[int] = Query(...),
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    check_batch_size(ids)
+    return await TodoModel.get_many_with_owner(session, ids, TodoModel.owner_id == owner_id)
 
 
 @router.get('/{id}', response_model=TodoSchema)
 async def get_todo(
         id: int,
-        session: AsyncSession = Depends(get_session)):
-    todo = await TodoModel.get(session, id)
-    if todo is None:
+        request: Request,
+        response: Response,
+        owner_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_read_session)):
+    todo = await TodoModel.get_cached(session, id)
+    if todo is None or todo["owner_id"] != owner_id:
         raise HTTPException(status_code=404, detail="Todo with this id not found!")
-    # if todo.owner_id != credentials.subject["id"]:
-    #     raise HTTPException(status_code=401, detail="Requested todo is not yours!")
+    etag = make_etag("todo", todo["id"], todo["version"])
+    cached = not_modified(request, etag, todo["updated_at"])
+    if cached is not None:
+        return cached
+    response.headers.update(validator_headers(etag, todo["updated_at"]))
     return todo
@@ -1,21 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Security
-from fastapi_jwt import JwtAuthorizationCredentials
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import jwt_config
-from services.database import get_session
-from views.auth import login
-from views.schemas.user import UserSchema, UserSchemaCreate, UserSchemaUpdate, UserSchemaSignin, UserSchemaCreateResponse
+from config import config
+from services.auth import get_current_user_id
+from services.ratelimit import limiter
+from services.database import get_session, get_owner_session, get_owner_read_session, get_read_session, \
+    sessionmanager
+from services.jobs import job_runner
+from services.token_store import token_store
+from services.tokens import issue_tokens
+from views.schemas.user import UserSchema, UserSchemaCreate, UserSchemaUpdate, UserSchemaCreateResponse
+from models.change import TodoChange as TodoChangeModel
+from models.todo import Todo as TodoModel
 from models.user import User as UserModel
-from utils import without_keys, JWTPayloadError
+from utils import JWTPayloadError
+from utils.http import make_etag, not_modified, validator_headers
 
 router = APIRouter(prefix='/users', tags=['User'])
+limiter.limit('/users/create', config.RATE_LIMIT_SIGNUP, key="ip", methods=["POST"])
+limiter.limit(router.prefix, config.RATE_LIMIT_USERS, key="user")
+logger = logging.getLogger(__name__)
 
 
 @router.get('/me', response_model=UserSchema)
-async def me(session: AsyncSession = Depends(get_session),
-             credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security)):
-    return await get_user(credentials.subject["id"], session)
+async def me(request: Request,
+             response: Response,
+             session: AsyncSession = Depends(get_owner_read_session),
+             user_id: int = Depends(get_current_user_id)):
+    return await get_user(user_id, request, response, session)
 
 
 @router.post('/create', response_model=UserSchemaCreateResponse)
@@ -23,54 +37,82 @@ async def create_user(user_data: UserSchemaCreate, session: AsyncSession = Depen
     try:
         new_user_data = user_data.model_dump(exclude_none=True)
         user = await UserModel.create(session, **new_user_data)
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        print(str(e))
+        logger.exception("Error creating user", extra={"username": user_data.username})
         raise HTTPException(status_code=400, detail=str(e))
     if 'id' not in user.__dict__:
         raise HTTPException(status_code=400, detail="Error creating user!")
-    tokens = await login(UserSchemaSignin(username=user_data.username, password=user_data.password), session=session)
-    return UserSchemaCreateResponse(**user.__dict__, tokens=tokens)
+    sessionmanager.note_write(user.id)
+    # the password was just hashed for this user, verifying it again would only double the bcrypt cost
+    tokens = await issue_tokens(user.id)
+    return UserSchemaCreateResponse(**user.as_dict(exclude=UserModel.__cache_exclude__), tokens=tokens)
 
 
 @router.put('/update', response_model=UserSchema)
 async def update_user(
         data_to_update: UserSchemaUpdate,
-        session: AsyncSession = Depends(get_session),
-        credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security),
+        session: AsyncSession = Depends(get_owner_session),
+        user_id: int = Depends(get_current_user_id),
 ):
     try:
         transaction = data_to_update.model_dump(exclude_none=True)
-        todo = await UserModel.update(session, **transaction, id=credentials.subject["id"])
-        return without_keys(todo.__dict__, ["password"])
+        user = await UserModel.update(session, **transaction, id=user_id)
+        return user.as_dict(exclude=UserModel.__cache_exclude__)
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(str(e))
+        logger.exception("Error updating user", extra={"user_id": user_id})
         raise HTTPException(status_code=400, detail="Error updating user!")
 
 
 @router.delete('/delete')
 async def delete_user(
-        credentials: JwtAuthorizationCredentials = Security(jwt_config.access_security),
-        session: AsyncSession = Depends(get_session)
+        user_id: int = Depends(get_current_user_id),
+        session: AsyncSession = Depends(get_owner_session)
 ):
     try:
-        is_deleted = await UserModel.delete(session, credentials.subject["id"])
+        # the account disappears right away, its data is removed in chunks by the purge_user job
+        is_deleted = await UserModel.mark_deleted(session, user_id, max_attempts=config.JOBS_MAX_ATTEMPTS)
         if is_deleted:
+            await token_store.revoke_user(user_id)
+            job_runner.notify()
             return Response(status_code=200, content="Successfully deleted user")
         else:
             raise HTTPException(status_code=404, detail="User not found!")
+    except HTTPException as e:
+        raise e
     except KeyError as e:
-        print(str(e))
+        logger.warning("Malformed JWT payload", extra={"missing_key": str(e)})
         raise JWTPayloadError(detail=str(e))
     except Exception as e:
-        print(str(e))
+        logger.exception("Error deleting user", extra={"user_id": user_id})
         raise HTTPException(status_code=500, detail="Error deleting user")
 
 
+@job_runner.handler("purge_user")
+async def purge_user(payload: dict) -> bool:
+    user_id = payload["user_id"]
+    async with sessionmanager.session() as session:
+        if await TodoModel.purge_chunk_for(user_id, session, config.USER_PURGE_CHUNK_SIZE):
+            return True
+        if await TodoChangeModel.purge_chunk_for(user_id, session, config.USER_PURGE_CHUNK_SIZE):
+            return True
+        await TodoModel.purge_owner(user_id, session)
+    logger.info("Purged deleted user", extra={"user_id": user_id})
+    return False
+
+
 @router.get('/{id}', response_model=UserSchema)
-async def get_user(id: int, session: AsyncSession = Depends(get_session)):
-    user = await UserModel.get(session, id)
+async def get_user(id: int, request: Request, response: Response,
+                   session: AsyncSession = Depends(get_read_session)):
+    user = await UserModel.get_cached(session, id)
     if user is None:
         raise HTTPException(status_code=404, detail="User with this id not found!")
-    return without_keys(user.__dict__, ["password"])
+    etag = make_etag("user", user["id"], user["version"])
+    cached = not_modified(request, etag, user["updated_at"])
+    if cached is not None:
+        return cached
+    response.headers.update(validator_headers(etag, user["updated_at"]))
+    return user